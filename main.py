@@ -6,59 +6,76 @@ Command-line interface for all ChinoSRS workflows.
 """
 
 import argparse
+import importlib
 import os
+import shutil
 import sys
 import subprocess
 from pathlib import Path
 
+# Workflow scripts import each other as top-level modules (anki.*, audio.*)
+SRC_DIR = Path(__file__).resolve().parent / "src"
+if str(SRC_DIR) not in sys.path:
+    sys.path.insert(0, str(SRC_DIR))
+
 # Fix Windows console encoding
-if sys.platform == "win32":
-    import codecs
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.buffer, "strict")
-    sys.stderr = codecs.getwriter("utf-8")(sys.stderr.buffer, "strict")
+if sys.platform == "win32" and hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
+    sys.stderr.reconfigure(encoding="utf-8")
+
 
+# ANSI color codes for pretty output (disabled when stdout is not a terminal)
+_TTY = sys.stdout.isatty()
+HEADER = '\033[95m' if _TTY else ''
+BLUE = '\033[94m' if _TTY else ''
+CYAN = '\033[96m' if _TTY else ''
+GREEN = '\033[92m' if _TTY else ''
+YELLOW = '\033[93m' if _TTY else ''
+RED = '\033[91m' if _TTY else ''
+END = '\033[0m' if _TTY else ''
+BOLD = '\033[1m' if _TTY else ''
 
-# ANSI color codes for pretty output
-class Colors:
-    HEADER = '\033[95m'
-    BLUE = '\033[94m'
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    END = '\033[0m'
-    BOLD = '\033[1m'
+
+_HEADER_BAR = f"{BOLD}{CYAN}{'='*60}{END}"
 
 
 def print_header(text):
     """Print a colored header."""
-    print(f"\n{Colors.BOLD}{Colors.CYAN}{'='*60}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{text.center(60)}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.CYAN}{'='*60}{Colors.END}\n")
+    sys.stdout.write(f"\n{_HEADER_BAR}\n{BOLD}{CYAN}{text.center(60)}{END}\n{_HEADER_BAR}\n\n")
 
 
 def print_success(text):
     """Print success message."""
-    print(f"{Colors.GREEN}✓ {text}{Colors.END}")
+    print(f"{GREEN}✓ {text}{END}")
 
 
 def print_error(text):
     """Print error message."""
-    print(f"{Colors.RED}✗ {text}{Colors.END}")
+    print(f"{RED}✗ {text}{END}")
 
 
 def print_info(text):
     """Print info message."""
-    print(f"{Colors.BLUE}ℹ {text}{Colors.END}")
+    print(f"{BLUE}ℹ {text}{END}")
 
 
 def run_command(cmd, description):
     """Run a command and handle errors."""
     print_info(f"Running: {description}")
-    print(f"{Colors.YELLOW}Command: {' '.join(cmd)}{Colors.END}\n")
+    print(f"{YELLOW}Command: {' '.join(cmd)}{END}\n")
+    
+    popen_kwargs = {}
+    if os.name == "posix":
+        # Let CPython use posix_spawn instead of fork+exec: it needs an executable
+        # path with a directory and close_fds=False (our fds are non-inheritable
+        # by default, see PEP 446, so nothing leaks into the child)
+        executable = shutil.which(cmd[0])
+        if executable:
+            cmd = [os.path.abspath(executable)] + cmd[1:]
+        popen_kwargs["close_fds"] = False
     
     try:
-        result = subprocess.run(cmd, check=True)
+        result = subprocess.run(cmd, check=True, **popen_kwargs)
         print_success(f"Completed: {description}")
         return True
     except subprocess.CalledProcessError as e:
@@ -70,6 +87,47 @@ def run_command(cmd, description):
         return False
 
 
+def run_module(module_name, script, argv, description):
+    """Run a workflow script's main(argv) in-process.
+
+    Falls back to a subprocess (see run_command) when the module cannot be
+    imported in this interpreter, e.g. dependencies only installed in anki-venv.
+    """
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError as e:
+        print_info(f"In-process import of {module_name} failed ({e}), using subprocess")
+        return run_command([get_python_cmd(), script] + argv, description)
+    
+    print_info(f"Running: {description}")
+    print(f"{YELLOW}Command: {script} {' '.join(argv)}{END}\n")
+    
+    try:
+        returncode = module.main(argv)
+    except SystemExit as e:
+        returncode = e.code
+    except KeyboardInterrupt:
+        print_error(f"Interrupted: {description}")
+        return False
+    except Exception as e:
+        print_error(f"Failed: {description}")
+        print_error(f"{type(e).__name__}: {e}")
+        return False
+    
+    if returncode is None:
+        returncode = 0
+    elif not isinstance(returncode, int):
+        print_error(str(returncode))
+        returncode = 1
+    
+    if returncode == 0:
+        print_success(f"Completed: {description}")
+        return True
+    print_error(f"Failed: {description}")
+    print_error(f"Error code: {returncode}")
+    return False
+
+
 def get_python_cmd():
     """Get the appropriate Python command."""
     if os.path.exists("anki-venv/Scripts/python.exe"):
@@ -84,17 +142,27 @@ def workflow_generate_vocab(args):
     """Workflow 1: Generate vocabulary CSV with AI enrichment."""
     print_header("📚 Generate Vocabulary CSV")
     
-    python_cmd = get_python_cmd()
-    cmd = [python_cmd, "src/generate_vocab_csv.py"]
+    cmd_args = []
     
     if args.input:
-        cmd.extend(["--input", args.input])
+        cmd_args.extend(["--input", args.input])
     if args.output:
-        cmd.extend(["--output", args.output])
+        cmd_args.extend(["--output", args.output])
     if args.limit:
-        cmd.extend(["--max-items", str(args.limit)])
-    
-    return run_command(cmd, "Vocabulary generation with AI enrichment")
+        cmd_args.extend(["--max-items", str(args.limit)])
+    if args.concurrency:
+        cmd_args.extend(["--concurrency", str(args.concurrency)])
+    if args.entries_per_request:
+        cmd_args.extend(["--entries-per-request", str(args.entries_per_request)])
+    if args.mode:
+        cmd_args.extend(["--mode", args.mode])
+    if args.resume:
+        cmd_args.append("--resume")
+    if args.skip_cache:
+        cmd_args.append("--skip-cache")
+    
+    return run_module("generate_vocab_csv", "src/generate_vocab_csv.py", cmd_args,
+                      "Vocabulary generation with AI enrichment")
 
 
 def workflow_generate_audio(args):
@@ -109,17 +177,18 @@ def workflow_generate_audio(args):
         print_error(f"CSV file not found: {args.csv}")
         return False
     
-    python_cmd = get_python_cmd()
-    
     # Determine engine name for display
     engine_name = "Google TTS" if args.engine == "gtts" else "Azure TTS"
     
     # Run audio generation
-    cmd = [python_cmd, "src/audio/generate_audio.py", "--csv", args.csv, "--engine", args.engine]
+    cmd_args = ["--csv", args.csv, "--engine", args.engine]
+    if args.workers:
+        cmd_args.extend(["--workers", str(args.workers)])
     print_info(f"Using CSV: {args.csv}")
     print_info(f"Engine: {engine_name}")
     
-    return run_command(cmd, f"Audio generation with {engine_name}")
+    return run_module("audio.generate_audio", "src/audio/generate_audio.py", cmd_args,
+                      f"Audio generation with {engine_name}")
 
 
 def workflow_create_anki_deck(args):
@@ -134,33 +203,33 @@ def workflow_create_anki_deck(args):
         print_error(f"CSV file not found: {args.csv}")
         return False
     
-    python_cmd = get_python_cmd()
-    cmd = [python_cmd, "src/csv_to_anki.py", args.csv]
+    cmd_args = [args.csv]
     
     if args.limit:
-        cmd.extend(["--limit", str(args.limit)])
+        cmd_args.extend(["--limit", str(args.limit)])
     if args.force_recreate:
-        cmd.append("--force-recreate")
+        cmd_args.append("--force-recreate")
     if args.only_deduplicated:
-        cmd.append("--only-deduplicated")
+        cmd_args.append("--only-deduplicated")
         print_info("Mode: Only uploading deduplicated notes")
+    if args.workers:
+        cmd_args.extend(["--workers", str(args.workers)])
     
-    return run_command(cmd, "Anki deck creation")
+    return run_module("csv_to_anki", "src/csv_to_anki.py", cmd_args, "Anki deck creation")
 
 
 def workflow_dump_deck(args):
     """Workflow 4: Dump Anki deck contents."""
     print_header("📋 Dump Anki Deck")
     
-    python_cmd = get_python_cmd()
-    cmd = [python_cmd, "src/utils/dump_deck.py"]
+    cmd_args = []
     
     if args.deck:
-        cmd.extend(["--deck", args.deck])
+        cmd_args.extend(["--deck", args.deck])
     if args.output:
-        cmd.extend(["--output", args.output])
+        cmd_args.extend(["--output", args.output])
     
-    return run_command(cmd, "Anki deck dump")
+    return run_module("utils.dump_deck", "src/utils/dump_deck.py", cmd_args, "Anki deck dump")
 
 
 def workflow_validate_csv(args):
@@ -214,6 +283,9 @@ def workflow_validate_audio(args):
     if args.export_missing:
         cmd.extend(["--export-missing", args.export_missing])
     
+    if args.workers > 1:
+        cmd.extend(["--workers", str(args.workers)])
+    
     return run_command(cmd, "Audio files validation")
 
 
@@ -332,12 +404,22 @@ Examples:
     vocab_parser.add_argument("--input", help="Input JSON file")
     vocab_parser.add_argument("--output", help="Output CSV file")
     vocab_parser.add_argument("--limit", type=int, help="Limit number of entries")
+    vocab_parser.add_argument("--concurrency", type=int, help="Concurrent OpenAI requests (default: 20)")
+    vocab_parser.add_argument("--entries-per-request", type=int,
+                              help="Words per realtime OpenAI request (default: 1)")
+    vocab_parser.add_argument("--mode", choices=["realtime", "batch"],
+                              help="realtime requests or the OpenAI Batch API (half price, up to 24h)")
+    vocab_parser.add_argument("--resume", action="store_true",
+                              help="Append to an existing output CSV, skipping words it already has")
+    vocab_parser.add_argument("--skip-cache", action="store_true",
+                              help="Don't read or store cached OpenAI responses")
     
     # Audio generation
     audio_parser = subparsers.add_parser("audio", help="Generate audio files")
     audio_parser.add_argument("--engine", choices=["gtts", "azure"], default="gtts",
                              help="TTS engine to use (default: gtts)")
     audio_parser.add_argument("--csv", required=True, help="CSV file to process")
+    audio_parser.add_argument("--workers", type=int, help="Rows to process in parallel (default: 8)")
     
     # Anki deck creation
     anki_parser = subparsers.add_parser("anki", help="Create Anki deck from CSV")
@@ -347,6 +429,7 @@ Examples:
                             help="Force recreate card models")
     anki_parser.add_argument("--only-deduplicated", action="store_true",
                             help="Only upload notes that were deduplicated (had duplicate SortKeys)")
+    anki_parser.add_argument("--workers", type=int, help="Processes used to build notes (default: CPU count)")
     
     # Dump deck
     dump_parser = subparsers.add_parser("dump", help="Dump Anki deck contents")
@@ -372,6 +455,8 @@ Examples:
                                       help="Show list of missing audio files")
     validate_audio_parser.add_argument("--export-missing", metavar="OUTPUT_FILE",
                                       help="Export missing files list to text file")
+    validate_audio_parser.add_argument("--workers", type=int, default=1,
+                                      help="Processes used to compute expected filenames (default: 1)")
     
     # Normalize pinyin
     normalize_parser = subparsers.add_parser("normalize-pinyin", help="Normalize pinyin formats in CSV")
@@ -396,12 +481,12 @@ Examples:
         sys.exit(0)
     
     # Print banner
-    print(f"\n{Colors.BOLD}{Colors.HEADER}")
+    print(f"\n{BOLD}{HEADER}")
     print("  ╔═══════════════════════════════════════════════╗")
     print("  ║           ChinoSRS - Orchestrator             ║")
     print("  ║      Chinese SRS Card Generator v1.0          ║")
     print("  ╚═══════════════════════════════════════════════╝")
-    print(f"{Colors.END}")
+    print(f"{END}")
     
     # Execute the appropriate workflow
     success = False
@@ -424,10 +509,10 @@ Examples:
     
     # Exit with appropriate code
     if success:
-        print(f"\n{Colors.GREEN}{Colors.BOLD}✓ Operation completed successfully!{Colors.END}\n")
+        print(f"\n{GREEN}{BOLD}✓ Operation completed successfully!{END}\n")
         sys.exit(0)
     else:
-        print(f"\n{Colors.RED}{Colors.BOLD}✗ Operation failed!{Colors.END}\n")
+        print(f"\n{RED}{BOLD}✗ Operation failed!{END}\n")
         sys.exit(1)
 
 
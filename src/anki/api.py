@@ -2,12 +2,28 @@
 
 import json
 import os
+import stat
 import sys
 import hashlib
-import urllib.request
-from typing import Optional
+import http.client
+import urllib.parse
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # optional: faster JSON for large responses (e.g. notesInfo)
+    orjson = None
+
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+    _loads = json.loads  # accepts UTF-8 bytes directly
+
 # Cargar variables de entorno
 load_dotenv()
 
@@ -15,62 +31,116 @@ ANKI_CONNECT_URL = os.environ.get("ANKI_CONNECT_URL", "http://localhost:8765")
 DECK_NAME = os.environ.get("ANKI_DECK_NAME", "Chino SRS")
 AUDIO_DIR = os.environ.get("ANKI_AUDIO_DIR", "")
 
+_ANKI_URL = urllib.parse.urlsplit(ANKI_CONNECT_URL)
+_ANKI_PATH = _ANKI_URL.path or "/"
+_ANKI_HEADERS = {"Content-Type": "application/json"}
+
+def _new_connection() -> http.client.HTTPConnection:
+    """Open a connection to the AnkiConnect host."""
+    if _ANKI_URL.scheme == "https":
+        return http.client.HTTPSConnection(_ANKI_URL.hostname, _ANKI_URL.port)
+    return http.client.HTTPConnection(_ANKI_URL.hostname, _ANKI_URL.port)
+
+
+def _send(payload: bytes) -> Tuple[int, bytes]:
+    """
+    POST payload to AnkiConnect on a new connection. Returns (status, body).
+    AnkiConnect closes the socket after every response (without sending
+    "Connection: close"), so connections can't be reused across calls.
+    """
+    conn = _new_connection()
+    try:
+        conn.request("POST", _ANKI_PATH, body=payload, headers=_ANKI_HEADERS)
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
 
 def post(action: str, **params):
     """Send a request to AnkiConnect."""
-    payload = json.dumps({"action": action, "version": 6, "params": params}).encode("utf-8")
-    req = urllib.request.Request(ANKI_CONNECT_URL, data=payload, headers={"Content-Type": "application/json"})
+    payload = _dumps({"action": action, "version": 6, "params": params})
     try:
-        with urllib.request.urlopen(req) as resp:
-            resp_data = resp.read()
-            data = json.loads(resp_data.decode("utf-8"))
-            if data.get("error") is not None:
-                # For addNotes, duplicates are returned in the result array, not as errors
-                # Only raise if it's a real error, not a duplicate warning
-                error_msg = str(data['error'])
-                if action == "addNotes" and "duplicate" in error_msg.lower():
-                    # Return the result anyway, it will contain None for duplicates
-                    return data.get("result")
-                raise RuntimeError(f"AnkiConnect error in {action}: {data['error']}")
-            
-            result = data.get("result")
-            # If result is None for addNotes, include the full response for debugging
-            if result is None and action == "addNotes":
-                raise RuntimeError(f"AnkiConnect returned None for {action}. Full response: {json.dumps(data, indent=2)}")
-            
-            return result
-    except urllib.error.HTTPError as e:
-        error_body = e.read().decode('utf-8') if hasattr(e, 'read') else str(e)
-        raise RuntimeError(f"HTTP {e.code} error calling AnkiConnect at {ANKI_CONNECT_URL} for action {action}: {error_body}")
-    except urllib.error.URLError as e:
-        raise RuntimeError(f"Connection error calling AnkiConnect at {ANKI_CONNECT_URL} for action {action}: {e.reason}")
+        status, resp_data = _send(payload)
+        if status != 200:
+            error_body = resp_data.decode("utf-8", errors="replace")
+            raise RuntimeError(f"HTTP {status} error calling AnkiConnect at {ANKI_CONNECT_URL} for action {action}: {error_body}")
+        
+        data = _loads(resp_data)
+        if data.get("error") is not None:
+            # For addNotes, duplicates are returned in the result array, not as errors
+            # Only raise if it's a real error, not a duplicate warning
+            error_msg = str(data['error'])
+            if action == "addNotes" and "duplicate" in error_msg.lower():
+                # Return the result anyway, it will contain None for duplicates
+                return data.get("result")
+            raise RuntimeError(f"AnkiConnect error in {action}: {data['error']}")
+        
+        result = data.get("result")
+        # If result is None for addNotes, include the full response for debugging
+        if result is None and action == "addNotes":
+            raise RuntimeError(f"AnkiConnect returned None for {action}. Full response: {json.dumps(data, indent=2)}")
+        
+        return result
+    except OSError as e:
+        raise RuntimeError(f"Connection error calling AnkiConnect at {ANKI_CONNECT_URL} for action {action}: {e}")
     except Exception as e:
         if isinstance(e, RuntimeError):
             raise
         raise RuntimeError(f"Unexpected error calling AnkiConnect at {ANKI_CONNECT_URL} for action {action}: {type(e).__name__}: {e}")
 
 
-def ensure_deck(deck_name: str):
-    """Create deck if it doesn't exist."""
-    existing = post("deckNames")
+def post_multi(actions: List[Dict]) -> List:
+    """
+    Send several actions to AnkiConnect in a single request (the "multi" action).
+    Each action is a dict with "action" and optional "params".
+    Returns the results in the same order as the actions.
+    """
+    requests_ = [{"action": a["action"], "version": 6, "params": a.get("params", {})} for a in actions]
+    responses = post("multi", actions=requests_)
+    results = []
+    for action, response in zip(actions, responses):
+        if response.get("error") is not None:
+            raise RuntimeError(f"AnkiConnect error in {action['action']}: {response['error']}")
+        results.append(response.get("result"))
+    return results
+
+
+def get_deck_and_model_names() -> Tuple[List[str], List[str]]:
+    """Fetch existing deck names and model names in one round-trip."""
+    deck_names, model_names = post_multi([{"action": "deckNames"}, {"action": "modelNames"}])
+    return deck_names, model_names
+
+
+def ensure_deck(deck_name: str, deck_names: Optional[List[str]] = None):
+    """Create deck if it doesn't exist.
+    
+    deck_names can be passed if already fetched, to skip the deckNames request.
+    """
+    existing = deck_names if deck_names is not None else post("deckNames")
     if deck_name not in existing:
         post("createDeck", deck=deck_name)
 
 
-def model_exists(model_name: str) -> bool:
-    """Check if a model/note type exists."""
-    names = post("modelNames")
+def model_exists(model_name: str, model_names: Optional[List[str]] = None) -> bool:
+    """Check if a model/note type exists.
+    
+    model_names can be passed if already fetched, to skip the modelNames request.
+    """
+    names = model_names if model_names is not None else post("modelNames")
     return model_name in names
 
 
-def delete_model(model_name: str):
-    """Delete a model/note type if it exists."""
-    if model_exists(model_name):
+def delete_model(model_name: str, model_names: Optional[List[str]] = None) -> bool:
+    """Delete a model/note type if it exists. Returns True if it was deleted."""
+    if model_exists(model_name, model_names):
         try:
             post("deleteModel", modelName=model_name)
             print(f"Deleted model: {model_name}")
+            return True
         except Exception as e:
             print(f"Warning: Could not delete model {model_name}: {e}", file=sys.stderr)
+    return False
 
 
 def resolve_audio_path(audio_field: str, hanzi: str) -> Optional[str]:
@@ -91,21 +161,63 @@ def resolve_audio_path(audio_field: str, hanzi: str) -> Optional[str]:
     return None
 
 
+@lru_cache(maxsize=8192)
+def _hash8(text: str) -> str:
+    """
+    Short hash used in audio filenames.
+    Must stay MD5 to match the names written by generate_audio.py.
+    """
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
+
+
+@lru_cache(maxsize=16)
+def _index_audio_dir(audio_dir: str, mtime_ns: int) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Index the .mp3 files in audio_dir by the 8-char hash at the end of their name.
+    Only regular files are indexed, so callers don't need to stat the paths again.
+    Returns (sentence_index, word_index), both mapping hash -> absolute path.
+    The directory mtime is part of the cache key so the index is rebuilt
+    whenever files are added or removed.
+    """
+    sentence_index = {}
+    word_index = {}
+    with os.scandir(audio_dir) as entries:
+        for entry in entries:
+            filename = entry.name
+            if not filename.endswith('.mp3') or not entry.is_file():
+                continue
+            file_hash = filename[:-4].rpartition('_')[2]
+            index = word_index if filename.startswith('word_') else sentence_index
+            index.setdefault(file_hash, os.path.abspath(entry.path))
+    return sentence_index, word_index
+
+
+def _audio_index(audio_dir: str) -> Optional[Tuple[Dict[str, str], Dict[str, str]]]:
+    """Get the (cached) hash index for audio_dir, or None if it is not a directory."""
+    try:
+        st = os.stat(audio_dir)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    return _index_audio_dir(audio_dir, st.st_mtime_ns)
+
+
 def find_audio_for_sentence(sentence: str, audio_dir: str = "resources/audios") -> Optional[str]:
     """
     Find audio file for a given sentence using hash-based matching.
     Returns absolute path if found, None otherwise.
     """
-    if not sentence or not os.path.isdir(audio_dir):
+    if not sentence:
         return None
     
-    sentence_hash = hashlib.md5(sentence.encode('utf-8')).hexdigest()[:8]
-    
-    for filename in os.listdir(audio_dir):
-        if filename.endswith('.mp3') and sentence_hash in filename:
-            return os.path.abspath(os.path.join(audio_dir, filename))
+    index = _audio_index(audio_dir)
+    if index is None:
+        return None
     
-    return None
+    sentence_hash = _hash8(sentence)
+    sentence_index, word_index = index
+    return sentence_index.get(sentence_hash) or word_index.get(sentence_hash)
 
 
 def find_audio_for_word(hanzi: str, audio_dir: str = "resources/audios") -> Optional[str]:
@@ -113,13 +225,12 @@ def find_audio_for_word(hanzi: str, audio_dir: str = "resources/audios") -> Opti
     Find audio file for a given word (hanzi) using hash-based matching.
     Returns absolute path if found, None otherwise.
     """
-    if not hanzi or not os.path.isdir(audio_dir):
+    if not hanzi:
         return None
     
-    word_hash = hashlib.md5(hanzi.encode('utf-8')).hexdigest()[:8]
-    
-    for filename in os.listdir(audio_dir):
-        if filename.startswith('word_') and filename.endswith('.mp3') and word_hash in filename:
-            return os.path.abspath(os.path.join(audio_dir, filename))
+    index = _audio_index(audio_dir)
+    if index is None:
+        return None
     
-    return None
+    word_hash = _hash8(hanzi)
+    return index[1].get(word_hash)
@@ -2,47 +2,117 @@
 
 import re
 import unicodedata
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, Tuple
 
 
+# Pinyin letters including tone-marked vowels
+_PINYIN_CHARS = "A-Za-zāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ"
+
+# Tone-marked pinyin vowels -> plain letters (same result as NFKD + dropping combining marks)
+_PINYIN_TONE_TABLE = str.maketrans(
+    "āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜüĀÁǍÀĒÉĚÈĪÍǏÌŌÓǑÒŪÚǓÙǕǗǙǛÜ",
+    "aaaaeeeeiiiioooouuuuuuuuuAAAAEEEEIIIIOOOOUUUUUUUUU",
+)
+
+# Precompiled patterns (these helpers run once per CSV row)
+_PAREN_TAIL_RE = re.compile(r'\s*\([^)]*\).*$')
+_PINYIN_PAREN_DOT_RE = re.compile(r'\s*\([' + _PINYIN_CHARS + r'\s]+\.\)')
+_PINYIN_PAREN_RE = re.compile(r'\s*\([' + _PINYIN_CHARS + r'\s]+\)')
+_PINYIN_PAREN_ANYCASE_RE = re.compile(r'\s*\([' + _PINYIN_CHARS + r'\s]+\)', re.IGNORECASE)
+_LEADING_PHRASE_BLANK_RE = re.compile(r'^(La palabra|El verbo|El sustantivo|La expresión)\s+___\s*', re.IGNORECASE)
+_LEADING_PHRASE_RE = re.compile(r'^(La palabra|El verbo|El sustantivo|La expresión)\s+', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+_LEADING_PUNCT_RE = re.compile(r'^[,\s\-]+')
+_UN_ES_RE = re.compile(r'^(Un|Una)\s+(es|significa|se\s+refiere)\s+', re.IGNORECASE)
+_SE_ES_RE = re.compile(r'^(se\s+refiere|se\s+utiliza|se\s+traduce|es\s+una?)\s+', re.IGNORECASE)
+# One ";"-separated POS code, leading whitespace and "pos:" prefix skipped
+_POS_TOKEN_RE = re.compile(r'(?:^|;)\s*(?:pos:)?([^;]*)')
+
+# Readable Spanish labels for CSV codes
+POS_MAP = {
+    "n.": "sustantivo", "v.": "verbo", "adj.": "adjetivo", "adv.": "adverbio",
+    "prep.": "preposición", "conj.": "conjunción", "pron.": "pronombre",
+    "num.": "numeral", "mw.": "clasificador", "part.": "partícula",
+    "interj.": "interjección", "a": "adjetivo", "ad": "adj. adverbial",
+    "ag": "morfema adj.", "an": "adj. nominal", "b": "adj. no-predicativo",
+    "c": "conjunción", "d": "adverbio", "dg": "morfema adv.",
+    "e": "interjección", "f": "localidad direccional", "g": "morfema",
+    "h": "prefijo", "i": "modismo", "j": "abreviatura", "k": "sufijo",
+    "l": "expresión fija", "m": "numeral", "mg": "morfema num.",
+    "n": "sustantivo", "ng": "morfema sust.", "nr": "nombre personal",
+    "ns": "nombre de lugar", "nt": "nombre organización", "nx": "cadena nominal",
+    "nz": "nombre propio", "o": "onomatopeya", "p": "preposición",
+    "q": "clasificador", "r": "pronombre", "rg": "morfema pron.",
+    "s": "palabra espacial", "t": "palabra temporal", "tg": "morfema temporal",
+    "u": "auxiliar", "v": "verbo", "vd": "verbo adverbial",
+    "vg": "morfema verbal", "vn": "verbo nominal", "w": "símbolo/puntuación",
+    "x": "no clasificado", "y": "partícula modal", "z": "descriptivo"
+}
+
+REG_MAP = {
+    "reg:colloquial": "coloquial",
+    "reg:neutral": "neutral",
+    "reg:formal": "formal",
+    "reg:literary": "literario"
+}
+
+FREQ_MAP = {
+    "top1k": "muy frecuente (top 1000)",
+    "top3k": "frecuente (top 3000)",
+    "top5k": "común (top 5000)",
+    "top10k": "poco común (top 10k)",
+    "rare": "rara"
+}
+
+LENGTH_MAP = {
+    "1": "1 carácter", "2": "2 caracteres", "3": "3 caracteres",
+    "4": "4 caracteres", "5": "5 caracteres", "5+": "5+ caracteres"
+}
+
+
+@lru_cache(maxsize=4096)
 def strip_diacritics(text: str) -> str:
     """Remove tone marks from pinyin."""
+    if text.isascii():
+        return text
+    text = text.translate(_PINYIN_TONE_TABLE)
+    if text.isascii():
+        return text
+    # Not plain pinyin (other accented letters): fall back to NFKD
     nfkd = unicodedata.normalize("NFKD", text)
-    return "".join([c for c in nfkd if not unicodedata.combining(c)])
+    return "".join(c for c in nfkd if not unicodedata.combining(c))
 
 
+@lru_cache(maxsize=4096)
 def pinyin_mask(pinyin: str) -> str:
     """
     Mask pinyin syllables: "xià yǔ" -> "x_ y_"
     """
     if not pinyin:
         return ""
-    p = strip_diacritics(pinyin).strip()
-    syllables = [s for s in re.split(r"\s+", p) if s]
-    masked = []
-    for syl in syllables:
-        first_letter = syl[0]
-        masked.append(f"{first_letter}_")
-    return " ".join(masked)
+    # str.split() already collapses runs of whitespace and drops empty pieces
+    return " ".join(syl[0] + "_" for syl in strip_diacritics(pinyin).split())
 
 
 def first_piece(text: str) -> str:
     """Get first piece from pipe-separated text."""
     if not text:
         return ""
-    parts = [p.strip() for p in str(text).split("|")]
-    return parts[0] if parts else ""
+    return str(text).partition("|")[0].strip()
 
 
 def longest_piece(text: str) -> str:
     """Get longest piece from pipe-separated text (more context)."""
     if not text:
         return ""
-    parts = [p.strip() for p in str(text).split("|") if p.strip()]
-    if not parts:
-        return ""
-    # Return the longest piece (more context for hints)
-    return max(parts, key=len)
+    # Return the longest piece (more context for hints); first one wins on ties
+    best = ""
+    for piece in str(text).split("|"):
+        piece = piece.strip()
+        if len(piece) > len(best):
+            best = piece
+    return best
 
 
 def remove_parentheses(text: str) -> str:
@@ -54,11 +124,19 @@ def remove_parentheses(text: str) -> str:
     """
     if not text:
         return ""
-    # Remove parentheses and everything after them (including " - translation")
-    result = re.sub(r'\s*\([^)]*\).*$', '', text)
-    return result.strip()
+    return _strip_paren_tail(text).strip()
+
+
+def _strip_paren_tail(text: str) -> str:
+    """remove_parentheses for text that is already stripped (nothing left to strip afterwards)."""
+    if "(" not in text:
+        return text
+    # Remove parentheses and everything after them (including " - translation");
+    # the leading \s* also eats the whitespace before the "("
+    return _PAREN_TAIL_RE.sub('', text)
 
 
+@lru_cache(maxsize=8192)
 def clean_pinyin_from_sentence(sentence: str) -> str:
     """Remove pinyin in parentheses from Chinese sentences.
     
@@ -71,8 +149,8 @@ def clean_pinyin_from_sentence(sentence: str) -> str:
     if not sentence:
         return ""
     # Remove pinyin in parentheses (contains lowercase letters and tone marks)
-    result = re.sub(r'\s*\([A-Za-zāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ\s]+\.\)', '', sentence)
-    result = re.sub(r'\s*\([A-Za-zāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ\s]+\)', '', result)
+    result = _PINYIN_PAREN_DOT_RE.sub('', sentence)
+    result = _PINYIN_PAREN_RE.sub('', result)
     return result.strip()
 
 
@@ -80,57 +158,34 @@ def oculta_objetivo_en_texto(texto: str, objetivo: str) -> str:
     """Replace target word with blanks."""
     if not texto or not objetivo:
         return texto or ""
+    if objetivo not in texto:
+        return texto
     return texto.replace(objetivo, "___")
 
 
+@lru_cache(maxsize=2048)
 def lookup_pos(pos_code: str) -> str:
     """Convert POS code to readable Spanish."""
     if not pos_code:
         return ""
     
-    pos_map = {
-        "n.": "sustantivo", "v.": "verbo", "adj.": "adjetivo", "adv.": "adverbio",
-        "prep.": "preposición", "conj.": "conjunción", "pron.": "pronombre",
-        "num.": "numeral", "mw.": "clasificador", "part.": "partícula",
-        "interj.": "interjección", "a": "adjetivo", "ad": "adj. adverbial",
-        "ag": "morfema adj.", "an": "adj. nominal", "b": "adj. no-predicativo",
-        "c": "conjunción", "d": "adverbio", "dg": "morfema adv.",
-        "e": "interjección", "f": "localidad direccional", "g": "morfema",
-        "h": "prefijo", "i": "modismo", "j": "abreviatura", "k": "sufijo",
-        "l": "expresión fija", "m": "numeral", "mg": "morfema num.",
-        "n": "sustantivo", "ng": "morfema sust.", "nr": "nombre personal",
-        "ns": "nombre de lugar", "nt": "nombre organización", "nx": "cadena nominal",
-        "nz": "nombre propio", "o": "onomatopeya", "p": "preposición",
-        "q": "clasificador", "r": "pronombre", "rg": "morfema pron.",
-        "s": "palabra espacial", "t": "palabra temporal", "tg": "morfema temporal",
-        "u": "auxiliar", "v": "verbo", "vd": "verbo adverbial",
-        "vg": "morfema verbal", "vn": "verbo nominal", "w": "símbolo/puntuación",
-        "x": "no clasificado", "y": "partícula modal", "z": "descriptivo"
-    }
-    
-    parts = []
-    for code in pos_code.split(";"):
-        code = code.strip()
-        if code.startswith("pos:"):
-            code = code[4:]
-        readable = pos_map.get(code.lower(), code)
-        if readable and readable not in parts:
-            parts.append(readable)
+    parts = {}  # dict as an ordered set
+    for m in _POS_TOKEN_RE.finditer(pos_code):
+        code = m.group(1).rstrip()
+        readable = POS_MAP.get(code.lower(), code)
+        if readable:
+            parts[readable] = None
     
     return ", ".join(parts) if parts else pos_code
 
 
+@lru_cache(maxsize=2048)
 def lookup_register(reg_code: str) -> str:
     """Convert register code to readable Spanish."""
-    reg_map = {
-        "reg:colloquial": "coloquial",
-        "reg:neutral": "neutral",
-        "reg:formal": "formal",
-        "reg:literary": "literario"
-    }
-    return reg_map.get(reg_code, reg_code)
+    return REG_MAP.get(reg_code, reg_code)
 
 
+@lru_cache(maxsize=2048)
 def lookup_frequency(freq_code: str) -> str:
     """Convert frequency code to readable Spanish."""
     if not freq_code:
@@ -138,22 +193,17 @@ def lookup_frequency(freq_code: str) -> str:
     parts = []
     for code in freq_code.split(";"):
         code = code.strip()
+        # Value is the text between the prefix and any further ":"
         if code.startswith("hsk:"):
-            level = code.split(":")[1]
+            level = code[4:].partition(":")[0]
             parts.append(f"HSK {level}")
         elif code.startswith("freq:"):
-            freq = code.split(":")[1]
-            freq_map = {
-                "top1k": "muy frecuente (top 1000)",
-                "top3k": "frecuente (top 3000)",
-                "top5k": "común (top 5000)",
-                "top10k": "poco común (top 10k)",
-                "rare": "rara"
-            }
-            parts.append(freq_map.get(freq, freq))
+            freq = code[5:].partition(":")[0]
+            parts.append(FREQ_MAP.get(freq, freq))
     return ", ".join(parts) if parts else freq_code
 
 
+@lru_cache(maxsize=2048)
 def lookup_length(length_code: str) -> str:
     """Convert length code to readable Spanish."""
     if not length_code:
@@ -167,11 +217,20 @@ def lookup_length(length_code: str) -> str:
     elif length_code == "word":
         return "palabra"
     
-    length_map = {
-        "1": "1 carácter", "2": "2 caracteres", "3": "3 caracteres",
-        "4": "4 caracteres", "5": "5 caracteres", "5+": "5+ caracteres"
-    }
-    return length_map.get(length_code, f"{length_code} caracteres")
+    return LENGTH_MAP.get(length_code, f"{length_code} caracteres")
+
+
+@lru_cache(maxsize=4096)
+def _compile_extractors(hanzi: str, pinyin: str) -> Tuple[re.Pattern, re.Pattern, re.Pattern]:
+    """Compile the word-specific patterns used by extract_definition_only."""
+    # Pattern 1: 'hanzi' (pinyin), "hanzi" (pinyin) or hanzi (pinyin)
+    hanzi_paren_re = re.compile(r"[''\"]*" + re.escape(hanzi) + r"[''\"]*\s*\([^)]*\)")
+    # Pattern 2: (pinyin) - flexible pattern for pinyin (handles spaces, tones, etc.)
+    pinyin_pattern = pinyin.replace(' ', r'\s*')
+    pinyin_paren_re = re.compile(r'\s*\([^)]*' + re.escape(pinyin_pattern) + r'[^)]*\)', re.IGNORECASE)
+    # Pattern 4: hanzi with any surrounding quotes
+    quoted_hanzi_re = re.compile(r"[''\"]*" + re.escape(hanzi) + r"[''\"]*")
+    return hanzi_paren_re, pinyin_paren_re, quoted_hanzi_re
 
 
 def extract_definition_only(definition: str, hanzi: str, pinyin: str) -> str:
@@ -180,39 +239,42 @@ def extract_definition_only(definition: str, hanzi: str, pinyin: str) -> str:
         return ""
     
     result = definition
+    hanzi_paren_re, pinyin_paren_re, quoted_hanzi_re = _compile_extractors(hanzi, pinyin)
     
-    # Pattern 1: Remove 'hanzi' (pinyin) or "hanzi" (pinyin) or hanzi (pinyin)
-    # Match any quotes around hanzi and pinyin in parentheses
-    result = re.sub(r"[''\"]*" + re.escape(hanzi) + r"[''\"]*\s*\([^)]*\)", "", result)
-    
-    # Pattern 2: Remove just (pinyin) - match pinyin with spaces and tone marks
-    # Create a flexible pattern for pinyin (handles spaces, tones, etc.)
-    pinyin_pattern = pinyin.replace(' ', r'\s*')
-    result = re.sub(r'\s*\([^)]*' + re.escape(pinyin_pattern) + r'[^)]*\)', '', result, flags=re.IGNORECASE)
+    # Patterns 1-3 all need a parenthesis; skip the regex passes for clean definitions
+    if "(" in result:
+        # Pattern 1: Remove 'hanzi' (pinyin) or "hanzi" (pinyin) or hanzi (pinyin)
+        # Match any quotes around hanzi and pinyin in parentheses
+        result = hanzi_paren_re.sub("", result)
+        
+        # Pattern 2: Remove just (pinyin) - match pinyin with spaces and tone marks
+        result = pinyin_paren_re.sub('', result)
+        
+        # Pattern 3: Remove standalone pinyin in parentheses (catch any remaining)
+        # Match common pinyin patterns: lowercase letters with optional tone marks and spaces
+        result = _PINYIN_PAREN_ANYCASE_RE.sub('', result)
     
-    # Pattern 3: Remove standalone pinyin in parentheses (catch any remaining)
-    # Match common pinyin patterns: lowercase letters with optional tone marks and spaces
-    result = re.sub(r'\s*\([a-zāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ\s]+\)', '', result, flags=re.IGNORECASE)
-    
-    # Pattern 4: Remove hanzi in quotes at the beginning or anywhere
-    result = re.sub(r"[''\"]*" + re.escape(hanzi) + r"[''\"]*", "___", result)
-    
-    # Pattern 5: Remove standalone hanzi
-    result = result.replace(hanzi, "___")
+    # Patterns 4-5 only apply if the hanzi still appears
+    if hanzi in result:
+        # Pattern 4: Remove hanzi in quotes at the beginning or anywhere
+        result = quoted_hanzi_re.sub("___", result)
+        
+        # Pattern 5: Remove standalone hanzi
+        result = result.replace(hanzi, "___")
     
     # Clean up: remove leading "La palabra", "El verbo", etc. if present
-    result = re.sub(r'^(La palabra|El verbo|El sustantivo|La expresión)\s+___\s*', '', result, flags=re.IGNORECASE)
-    result = re.sub(r'^(La palabra|El verbo|El sustantivo|La expresión)\s+', '', result, flags=re.IGNORECASE)
+    result = _LEADING_PHRASE_BLANK_RE.sub('', result)
+    result = _LEADING_PHRASE_RE.sub('', result)
     
     # Clean up extra spaces, punctuation, and leading/trailing whitespace
-    result = re.sub(r'\s+', ' ', result).strip()
-    result = re.sub(r'^[,\s\-]+', '', result)
+    result = _WHITESPACE_RE.sub(' ', result).strip()
+    result = _LEADING_PUNCT_RE.sub('', result)
     
     # Remove awkward leading phrases like "Un es" or "Una es"
-    result = re.sub(r'^(Un|Una)\s+(es|significa|se\s+refiere)\s+', r'\2 ', result, flags=re.IGNORECASE)
+    result = _UN_ES_RE.sub(r'\2 ', result)
     
     # Fix leading "se" or "es" phrases
-    result = re.sub(r'^(se\s+refiere|se\s+utiliza|se\s+traduce|es\s+una?)\s+', lambda m: m.group(1).capitalize() + ' ', result, flags=re.IGNORECASE)
+    result = _SE_ES_RE.sub(lambda m: m.group(1).capitalize() + ' ', result)
     
     # Capitalize first letter
     if result:
@@ -221,6 +283,22 @@ def extract_definition_only(definition: str, hanzi: str, pinyin: str) -> str:
     return result
 
 
+def _collocation_hint(collocations: str, hanzi: str, hide_word: bool) -> str:
+    """Phase 2 hint: the longest collocation, optionally with the target word hidden."""
+    if not collocations:
+        return ""
+    colloc_longest = longest_piece(collocations)
+    if hide_word:
+        colloc_hint = oculta_objetivo_en_texto(colloc_longest, hanzi)
+    else:
+        colloc_hint = colloc_longest
+    # Pieces from longest_piece are already stripped
+    colloc_hint = _strip_paren_tail(colloc_hint)
+    if colloc_hint and colloc_hint != "___":  # Avoid showing only blanks
+        return f"Colocación: {colloc_hint}"
+    return ""
+
+
 def build_hints(row: Dict[str, str], hanzi: str, pinyin: str, include_definition: bool = False, hide_word_in_collocation: bool = True) -> Dict[str, str]:
     """Build hints in 3-4 phases for progressive revelation.
     
@@ -242,42 +320,26 @@ def build_hints(row: Dict[str, str], hanzi: str, pinyin: str, include_definition
     definition = row.get("definition", "").strip()
 
     # Phase 1: Basic info
-    phase1 = []
-    if pos:
-        pos_readable = lookup_pos(pos)
-        phase1.append(f"Tipo: {pos_readable}")
-    if register:
-        reg_readable = lookup_register(register)
-        phase1.append(f"Registro: {reg_readable}")
-    if frecuencia:
-        freq_readable = lookup_frequency(frecuencia)
-        phase1.append(f"Nivel: {freq_readable}")
+    phase1 = " | ".join(filter(None, (
+        f"Tipo: {lookup_pos(pos)}" if pos else "",
+        f"Registro: {lookup_register(register)}" if register else "",
+        f"Nivel: {lookup_frequency(frecuencia)}" if frecuencia else "",
+    )))
 
     # Phase 2: Collocation hint (use longest for more context)
-    phase2 = ""
-    if collocations:
-        colloc_longest = longest_piece(collocations)
-        if hide_word_in_collocation:
-            colloc_hint = oculta_objetivo_en_texto(colloc_longest, hanzi)
-        else:
-            colloc_hint = colloc_longest
-        colloc_hint = remove_parentheses(colloc_hint)
-        if colloc_hint and colloc_hint != "___":  # Avoid showing only blanks
-            phase2 = f"Colocación: {colloc_hint}"
+    phase2 = _collocation_hint(collocations, hanzi, hide_word_in_collocation)
 
     # Phase 3: Pinyin and length
-    phase3 = []
     mask = pinyin_mask(pinyin)
-    if mask:
-        phase3.append(f"Pinyin: {mask}")
-    if longitud:
-        longitud_readable = lookup_length(longitud)
-        phase3.append(longitud_readable)
+    phase3 = " | ".join(filter(None, (
+        f"Pinyin: {mask}" if mask else "",
+        lookup_length(longitud) if longitud else "",
+    )))
 
     hints = {
-        "hint1": " | ".join(phase1) if phase1 else "",
+        "hint1": phase1,
         "hint2": phase2,
-        "hint3": " | ".join(phase3) if phase3 else ""
+        "hint3": phase3
     }
     
     # Phase 4: Definition without hanzi and pinyin (only for PatternCard)
@@ -286,3 +348,22 @@ def build_hints(row: Dict[str, str], hanzi: str, pinyin: str, include_definition
         hints["hint4"] = clean_definition if clean_definition else ""
     
     return hints
+
+
+def build_card_hints(row: Dict[str, str], hanzi: str, pinyin: str) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Build the hints for the three cards of a row in one go.
+    
+    Same as build_hints(..., hide_word_in_collocation=False) for SentenceCard
+    and build_hints(..., include_definition=True) for PatternCard/AudioCard,
+    but phases 1 and 3, which don't depend on the flags, are built once.
+    
+    Returns:
+        Tuple of (sentence_hints, definition_hints)
+    """
+    definition_hints = build_hints(row, hanzi, pinyin, include_definition=True)
+    sentence_hints = {
+        "hint1": definition_hints["hint1"],
+        "hint2": _collocation_hint(row.get("collocations", "").strip(), hanzi, False),
+        "hint3": definition_hints["hint3"]
+    }
+    return sentence_hints, definition_hints
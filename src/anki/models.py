@@ -1,10 +1,12 @@
 """Anki model/note type definitions."""
 
 import os
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Optional
 from .api import post, model_exists, delete_model
 
 
+@lru_cache(maxsize=32)
 def load_template(template_name: str) -> str:
     """Load HTML template from file."""
     template_path = os.path.join(os.path.dirname(__file__), "..", "templates", template_name)
@@ -12,12 +14,11 @@ def load_template(template_name: str) -> str:
         return f.read()
 
 
-def create_model_sentence(force_recreate: bool = False):
+def create_model_sentence(force_recreate: bool = False, model_names: Optional[List[str]] = None):
     """Create SentenceCard model."""
     model_name = "ChinoSRS_SentenceCard"
-    if force_recreate:
-        delete_model(model_name)
-    if model_exists(model_name):
+    deleted = force_recreate and delete_model(model_name, model_names)
+    if not deleted and model_exists(model_name, model_names):
         return
 
     fields = [
@@ -36,12 +37,11 @@ def create_model_sentence(force_recreate: bool = False):
     post("createModel", modelName=model_name, inOrderFields=fields, cardTemplates=templates, css=css)
 
 
-def create_model_pattern(force_recreate: bool = False):
+def create_model_pattern(force_recreate: bool = False, model_names: Optional[List[str]] = None):
     """Create PatternCard model."""
     model_name = "ChinoSRS_PatternCard"
-    if force_recreate:
-        delete_model(model_name)
-    if model_exists(model_name):
+    deleted = force_recreate and delete_model(model_name, model_names)
+    if not deleted and model_exists(model_name, model_names):
         return
 
     fields = [
@@ -60,12 +60,11 @@ def create_model_pattern(force_recreate: bool = False):
     post("createModel", modelName=model_name, inOrderFields=fields, cardTemplates=templates, css=css)
 
 
-def create_model_audio(force_recreate: bool = False):
+def create_model_audio(force_recreate: bool = False, model_names: Optional[List[str]] = None):
     """Create AudioCard model."""
     model_name = "ChinoSRS_AudioCard"
-    if force_recreate:
-        delete_model(model_name)
-    if model_exists(model_name):
+    deleted = force_recreate and delete_model(model_name, model_names)
+    if not deleted and model_exists(model_name, model_names):
         return
 
     fields = [
@@ -84,8 +83,13 @@ def create_model_audio(force_recreate: bool = False):
     post("createModel", modelName=model_name, inOrderFields=fields, cardTemplates=templates, css=css)
 
 
-def setup_models(force_recreate: bool = False):
-    """Set up all Anki models."""
-    create_model_sentence(force_recreate)
-    create_model_pattern(force_recreate)
-    create_model_audio(force_recreate)
+def setup_models(force_recreate: bool = False, model_names: Optional[List[str]] = None):
+    """Set up all Anki models.
+    
+    model_names can be passed if already fetched; otherwise they are requested once.
+    """
+    if model_names is None:
+        model_names = post("modelNames")
+    create_model_sentence(force_recreate, model_names)
+    create_model_pattern(force_recreate, model_names)
+    create_model_audio(force_recreate, model_names)
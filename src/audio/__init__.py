@@ -0,0 +1 @@
+"""Audio generation module for ChinoSRS."""
@@ -14,7 +14,7 @@ class AzureTTSEngine:
     """Azure Cognitive Services Text-to-Speech engine."""
     
     # Available Chinese voices with variety
-    CHINESE_VOICES = [
+    CHINESE_VOICES = (
         # Female voices
         "zh-CN-XiaoxiaoNeural",      # Young female, warm
         "zh-CN-XiaohanNeural",        # Young female, friendly
@@ -37,7 +37,7 @@ class AzureTTSEngine:
         "zh-CN-YunfengNeural",        # Mature male, authoritative
         "zh-CN-YunhaoNeural",         # Young male, friendly
         "zh-CN-YunyeNeural",          # Mature male, professional
-    ]
+    )
     
     def __init__(self, voice: str = None, speed: float = 1.0, random_voice: bool = False):
         """Initialize Azure TTS engine.
@@ -52,6 +52,23 @@ class AzureTTSEngine:
         self.random_voice = random_voice
         self.name = "Azure TTS"
         
+        # Pick the voice strategy once instead of branching on every request
+        if random_voice:
+            voices = self.CHINESE_VOICES
+            self._voice_getter = lambda: random.choice(voices)
+        else:
+            default_voice = self.default_voice
+            self._voice_getter = lambda: default_voice
+        
+        # Speed: 0.5 = 50% slower, 1.0 = normal, 1.5 = 50% faster, 2.0 = 2x faster
+        self._speed_percent = f"{int((self.speed - 1.0) * 100):+d}%"  # Convert to percentage
+        self._ssml_template = (
+            "<speak version='1.0' xml:lang='zh-CN'>"
+            "<voice xml:lang='zh-CN' name='{voice}'>"
+            "<prosody rate='{rate}'>{text}</prosody>"
+            "</voice></speak>"
+        )
+        
         # Load credentials from environment
         self.subscription_key = os.getenv("AZURE_TTS_KEY")
         self.region = os.getenv("AZURE_TTS_REGION", "eastus")
@@ -64,6 +81,15 @@ class AzureTTSEngine:
         
         # Build endpoint URL
         self.endpoint = f"https://{self.region}.tts.speech.microsoft.com/cognitiveservices/v1"
+        
+        # Reuse connections (and TLS sessions) across requests
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Ocp-Apim-Subscription-Key': self.subscription_key,
+            'Content-Type': 'application/ssml+xml',
+            'X-Microsoft-OutputFormat': 'audio-16khz-128kbitrate-mono-mp3',
+            'User-Agent': 'ChinoSRS'
+        })
     
     def get_voice(self) -> str:
         """Get voice to use for this generation.
@@ -71,9 +97,7 @@ class AzureTTSEngine:
         Returns:
             Voice name (random if random_voice is True)
         """
-        if self.random_voice:
-            return random.choice(self.CHINESE_VOICES)
-        return self.default_voice
+        return self._voice_getter()
     
     def generate_audio(self, text: str, output_path: str, max_retries: int = 5) -> bool:
         """Generate audio file from text using Azure TTS with retry logic.
@@ -90,42 +114,22 @@ class AzureTTSEngine:
             # Ensure output directory exists
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            # Prepare headers
-            headers = {
-                'Ocp-Apim-Subscription-Key': self.subscription_key,
-                'Content-Type': 'application/ssml+xml',
-                'X-Microsoft-OutputFormat': 'audio-16khz-128kbitrate-mono-mp3',
-                'User-Agent': 'ChinoSRS'
-            }
-            
             # Get voice for this generation
             voice = self.get_voice()
             
             # Prepare SSML body with speed control
-            # Speed: 0.5 = 50% slower, 1.0 = normal, 1.5 = 50% faster, 2.0 = 2x faster
-            speed_percent = f"{int((self.speed - 1.0) * 100):+d}%"  # Convert to percentage
-            
-            ssml = f"""<speak version='1.0' xml:lang='zh-CN'>
-                <voice xml:lang='zh-CN' name='{voice}'>
-                    <prosody rate='{speed_percent}'>
-                        {text}
-                    </prosody>
-                </voice>
-            </speak>"""
+            ssml = self._ssml_template.format(voice=voice, rate=self._speed_percent, text=text)
             
             # Retry logic with exponential backoff
             for attempt in range(max_retries):
                 # Make request
-                response = requests.post(self.endpoint, headers=headers, data=ssml.encode('utf-8'))
+                response = self.session.post(self.endpoint, data=ssml.encode('utf-8'))
                 
                 if response.status_code == 200:
                     # Save audio file
                     with open(output_path, 'wb') as f:
                         f.write(response.content)
                     
-                    # Small delay to respect rate limits (20 requests/min for free tier)
-                    time.sleep(0.15)  # 150ms delay between requests
-                    
                     # Verify file was created
                     if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                         return True
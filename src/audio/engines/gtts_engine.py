@@ -1,5 +1,6 @@
 """Google TTS Engine implementation."""
 
+import io
 import os
 from gtts import gTTS
 
@@ -30,9 +31,13 @@ class GTTSEngine:
             # Ensure output directory exists
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             
-            # Generate audio
+            # Generate audio in memory and write it with a single call, so a
+            # failed request never leaves a partial file behind
             tts = gTTS(text=text, lang=self.lang)
-            tts.save(output_path)
+            buffer = io.BytesIO()
+            tts.write_to_fp(buffer)
+            with open(output_path, "wb") as f:
+                f.write(buffer.getvalue())
             
             # Verify file was created
             if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
@@ -49,8 +54,5 @@ class GTTSEngine:
         Returns:
             True if the engine can be used
         """
-        try:
-            from gtts import gTTS
-            return True
-        except ImportError:
-            return False
+        # gtts is imported at module level, so if this class exists it is available
+        return True
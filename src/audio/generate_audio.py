@@ -9,36 +9,52 @@ import hashlib
 import os
 import re
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Optional
 
-# Configure UTF-8 encoding for Windows
-if sys.platform == "win32":
-    import codecs
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
-    sys.stderr = codecs.getwriter("utf-8")(sys.stderr.detach())
+# Add parent directory to path to import from anki and audio modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 # Import TTS engines
-from engines.gtts_engine import GTTSEngine
-from engines.azure_engine import AzureTTSEngine
-
-# Add parent directory to path to import from anki module
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from audio.engines.gtts_engine import GTTSEngine
+from audio.engines.azure_engine import AzureTTSEngine
 from anki.hints import clean_pinyin_from_sentence
 
 
 # Configuración
 AUDIO_DIR = "resources/audios"  # Directorio de salida
+DEFAULT_WORKERS = 8  # Filas procesadas en paralelo (TTS es I/O de red)
+
+# Characters removed from audio filenames (names must stay identical to
+# the ones already on disk, so whitespace is still collapsed to "_")
+_FILENAME_DELETE_TABLE = str.maketrans('', '', '<>:"/\\|?*')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Guards the per-run set of claimed output paths (see claim_output)
+_claim_lock = threading.Lock()
 
 
 def sanitize_filename(text: str) -> str:
     """Sanitize text for use in filename."""
     # Remove or replace problematic characters
-    text = re.sub(r'[<>:"/\\|?*]', '', text)
-    text = re.sub(r'\s+', '_', text)
+    text = text.translate(_FILENAME_DELETE_TABLE)
+    text = _WHITESPACE_RE.sub('_', text)
     return text[:50]  # Limit length
 
 
+@lru_cache(maxsize=8192)
+def _short_hash(text: str) -> str:
+    """
+    Short hash used in audio filenames.
+    Must stay MD5 so names match the files already generated (and anki.api).
+    """
+    return hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
+
+
 def get_tts_engine(engine_name: str):
     """Get TTS engine instance by name.
     
@@ -80,7 +96,63 @@ def get_tts_engine(engine_name: str):
         raise ValueError(f"Unknown engine: {engine_name}. Use 'gtts' or 'azure'")
 
 
-def process_csv_row(row: dict, row_num: int, engine, audio_dir: str):
+def file_exists(filename: str, output_path: str, existing: Optional[set]) -> bool:
+    """Check the pre-scanned filename set if there is one, else the filesystem."""
+    if existing is not None:
+        return filename in existing
+    return os.path.exists(output_path)
+
+
+def claim_output(output_path: str, claimed: Optional[set]) -> bool:
+    """
+    Mark output_path as generated (or being generated) in this run, so two rows
+    sharing a word or sentence don't write the same file at the same time.
+    Returns False if another row already claimed it. claimed=None disables claiming.
+    """
+    if claimed is None:
+        return True
+    with _claim_lock:
+        if output_path in claimed:
+            return False
+        claimed.add(output_path)
+        return True
+
+
+def release_output(output_path: str, claimed: Optional[set]):
+    """Drop the claim on output_path after a failed generation, so a later row retries it."""
+    if claimed is not None:
+        with _claim_lock:
+            claimed.discard(output_path)
+
+
+def count_csv_rows(csv_path: str) -> int:
+    """Count the data rows of a CSV without keeping them in memory."""
+    with open(csv_path, "r", encoding="utf-8") as f:
+        return sum(1 for _ in csv.DictReader(f))
+
+
+def map_in_order(executor, fn, items, window: int):
+    """
+    Like executor.map, but submits at most `window` items ahead of the one
+    being consumed, so `items` is read lazily instead of all at once.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def list_existing_audio(audio_dir: str) -> set:
+    """Names of the files already in audio_dir (one directory scan instead of a stat per file)."""
+    with os.scandir(audio_dir) as entries:
+        return {entry.name for entry in entries}
+
+
+def process_csv_row(row: dict, row_num: int, engine, audio_dir: str, existing: Optional[set] = None,
+                    claimed: Optional[set] = None):
     """
     Process a CSV row and generate audio files for the word and example sentences.
     
@@ -93,6 +165,9 @@ def process_csv_row(row: dict, row_num: int, engine, audio_dir: str):
         row_num: Row number for logging
         engine: TTS engine instance
         audio_dir: Directory to save audio files
+        existing: Filenames already in audio_dir (see list_existing_audio);
+            if None, each file is checked on disk
+        claimed: Output paths claimed by rows of the same run (see claim_output)
         
     Returns:
         List of generated filenames
@@ -100,60 +175,69 @@ def process_csv_row(row: dict, row_num: int, engine, audio_dir: str):
     hanzi = row.get("hanzi", "").strip()
     sentence_cn = row.get("example_sentence", "").strip()
     
-    # Clean pinyin from sentences to match CSV processing
-    sentence_cn = clean_pinyin_from_sentence(sentence_cn)
+    # Separate multiple sentences by | and clean pinyin from each, the same way
+    # csv_to_anki does (one pass per sentence, so filenames hash the same text)
+    cleaned = (clean_pinyin_from_sentence(s.strip()) for s in sentence_cn.split("|") if s.strip())
+    sentences = [s for s in cleaned if s]
+    dir_prefix = os.path.join(audio_dir, "")  # audio_dir with a trailing separator
     
-    generated_files = []
+    # Collect this row's messages and write them at once, so lines from rows
+    # processed in parallel don't interleave
+    log = []
+    try:
+        generated_files = []
     
-    # 1. Generate audio for the word alone
-    if hanzi:
-        word_hash = hashlib.md5(hanzi.encode('utf-8')).hexdigest()[:8]
-        word_filename = f"word_{sanitize_filename(hanzi)}_{word_hash}.mp3"
-        word_output_path = os.path.join(audio_dir, word_filename)
+        # 1. Generate audio for the word alone
+        if hanzi:
+            word_hash = _short_hash(hanzi)
+            word_filename = f"word_{sanitize_filename(hanzi)}_{word_hash}.mp3"
+            word_output_path = dir_prefix + word_filename
         
-        if os.path.exists(word_output_path):
-            print(f"Fila {row_num} ({hanzi}) [WORD]: Audio ya existe")
-            generated_files.append(word_filename)
-        else:
-            print(f"Fila {row_num} ({hanzi}) [WORD]: Generando audio de palabra...")
-            if engine.generate_audio(hanzi, word_output_path):
-                print(f"  -> Guardado: {word_filename}")
+            if file_exists(word_filename, word_output_path, existing) or not claim_output(word_output_path, claimed):
+                log.append(f"Fila {row_num} ({hanzi}) [WORD]: Audio ya existe")
                 generated_files.append(word_filename)
             else:
-                print(f"  -> ERROR al generar audio de palabra")
+                log.append(f"Fila {row_num} ({hanzi}) [WORD]: Generando audio de palabra...")
+                if engine.generate_audio(hanzi, word_output_path):
+                    log.append(f"  -> Guardado: {word_filename}")
+                    generated_files.append(word_filename)
+                else:
+                    release_output(word_output_path, claimed)
+                    log.append(f"  -> ERROR al generar audio de palabra")
     
-    # 2. Generate audio for example sentences
-    if not sentence_cn:
-        print(f"Fila {row_num} ({hanzi}): Sin frase de ejemplo, solo palabra generada")
-        return generated_files
-    
-    # Separate multiple sentences by | and clean pinyin from each
-    sentences = [clean_pinyin_from_sentence(s.strip()) for s in sentence_cn.split("|") if s.strip()]
+        # 2. Generate audio for example sentences
+        if not sentences:
+            log.append(f"Fila {row_num} ({hanzi}): Sin frase de ejemplo, solo palabra generada")
+            return generated_files
     
-    for idx, sentence in enumerate(sentences, start=1):
-        # Filename based on sentence (hash to avoid very long names)
-        sentence_hash = hashlib.md5(sentence.encode('utf-8')).hexdigest()[:8]
-        filename = f"{sanitize_filename(sentence[:30])}_{sentence_hash}.mp3"
-        output_path = os.path.join(audio_dir, filename)
+        for idx, sentence in enumerate(sentences, start=1):
+            # Filename based on sentence (hash to avoid very long names)
+            sentence_hash = _short_hash(sentence)
+            filename = f"{sanitize_filename(sentence[:30])}_{sentence_hash}.mp3"
+            output_path = dir_prefix + filename
         
-        # Skip if already exists
-        if os.path.exists(output_path):
-            print(f"Fila {row_num} ({hanzi}) [{idx}/{len(sentences)}]: Audio ya existe")
-            generated_files.append(filename)
-            continue
+            # Skip if already exists
+            if file_exists(filename, output_path, existing) or not claim_output(output_path, claimed):
+                log.append(f"Fila {row_num} ({hanzi}) [{idx}/{len(sentences)}]: Audio ya existe")
+                generated_files.append(filename)
+                continue
         
-        print(f"Fila {row_num} ({hanzi}) [{idx}/{len(sentences)}]: Generando '{sentence[:30]}...'")
+            log.append(f"Fila {row_num} ({hanzi}) [{idx}/{len(sentences)}]: Generando '{sentence[:30]}...'")
         
-        if engine.generate_audio(sentence, output_path):
-            print(f"  -> Guardado: {filename}")
-            generated_files.append(filename)
-        else:
-            print(f"  -> ERROR al generar")
+            if engine.generate_audio(sentence, output_path):
+                log.append(f"  -> Guardado: {filename}")
+                generated_files.append(filename)
+            else:
+                release_output(output_path, claimed)
+                log.append(f"  -> ERROR al generar")
     
-    return generated_files
+        return generated_files
+    finally:
+        if log:
+            sys.stdout.write("\n".join(log) + "\n")
 
 
-def main():
+def main(argv=None):
     """Main function."""
     # Parse arguments
     parser = argparse.ArgumentParser(description="Generar audios con TTS (Google o Azure)")
@@ -162,7 +246,9 @@ def main():
                        help="Motor TTS a usar (default: gtts)")
     parser.add_argument("--audio-dir", default=AUDIO_DIR,
                        help=f"Directorio de salida de audio (default: {AUDIO_DIR})")
-    args = parser.parse_args()
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                       help=f"Filas a procesar en paralelo (default: {DEFAULT_WORKERS}, 1 = secuencial)")
+    args = parser.parse_args(argv)
     
     csv_path = args.csv
     audio_dir = args.audio_dir
@@ -185,57 +271,80 @@ def main():
     
     # Ensure audio directory exists
     os.makedirs(audio_dir, exist_ok=True)
+    existing = list_existing_audio(audio_dir)
     
-    # Read CSV
-    with open(csv_path, "r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        rows = list(reader)
+    # Count rows first (cheap streaming pass) so progress/ETA work without
+    # keeping the whole CSV in memory
+    total_rows = count_csv_rows(csv_path)
     
-    print(f"Total de filas: {len(rows)}")
+    print(f"Total de filas: {total_rows}")
     print("-" * 60)
     
     # Process each row with progress tracking
     total_generated = 0
-    total_rows = len(rows)
     start_time = time.time()
     
-    for i, row in enumerate(rows, start=1):
-        row_start = time.time()
-        files = process_csv_row(row, i, engine, audio_dir)
-        total_generated += len(files)
-        
-        # Progress tracking
-        elapsed = time.time() - start_time
-        progress_pct = (i / total_rows) * 100
-        
-        if i > 0:
-            avg_time_per_row = elapsed / i
-            remaining_rows = total_rows - i
-            eta_seconds = avg_time_per_row * remaining_rows
-            eta_minutes = eta_seconds / 60
+    workers = max(1, args.workers)
+    print(f"Filas en paralelo: {workers}")
+    
+    # Output paths claimed by the rows of this run (new set per call, since
+    # main() can run several times in one process)
+    claimed = set()
+    
+    def run_row(item):
+        row_num, row = item
+        return process_csv_row(row, row_num, engine, audio_dir, existing, claimed)
+    
+    is_tty = sys.stdout.isatty()
+    
+    # Rows are independent and TTS calls are network-bound, so overlap them.
+    # Results come back in row order, which keeps the progress numbers exact.
+    with open(csv_path, "r", encoding="utf-8") as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        reader = csv.DictReader(f)
+        results = map_in_order(executor, run_row, enumerate(reader, start=1), window=workers * 2)
+        for i, files in enumerate(results, start=1):
+            total_generated += len(files)
             
-            # Print progress every 5 rows or at the end
-            if i % 5 == 0 or i == total_rows:
-                print(f"\n📊 Progreso: {i}/{total_rows} ({progress_pct:.1f}%) | "
-                      f"Tiempo: {elapsed/60:.1f}min | "
-                      f"ETA: {eta_minutes:.1f}min | "
-                      f"Audios: {total_generated}")
-                sys.stdout.flush()
+            # Progress tracking
+            elapsed = time.time() - start_time
+            progress_pct = (i / total_rows) * 100
+            
+            if i > 0:
+                avg_time_per_row = elapsed / i
+                remaining_rows = total_rows - i
+                eta_seconds = avg_time_per_row * remaining_rows
+                eta_minutes = eta_seconds / 60
+                
+                # Print progress every 5 rows or at the end
+                if i % 5 == 0 or i == total_rows:
+                    sys.stdout.write(f"\n📊 Progreso: {i}/{total_rows} ({progress_pct:.1f}%) | "
+                                     f"Tiempo: {elapsed/60:.1f}min | "
+                                     f"ETA: {eta_minutes:.1f}min | "
+                                     f"Audios: {total_generated}\n")
+                    # Flushing only matters for a live terminal; a redirected log
+                    # is flushed by its buffer (and at the last row)
+                    if is_tty or i == total_rows:
+                        sys.stdout.flush()
     
     # Final summary
     total_time = time.time() - start_time
     print("\n" + "=" * 60)
     print("✅ Resumen Final:")
     print(f"  Total de audios generados: {total_generated}")
-    print(f"  Total de entradas procesadas: {len(rows)}")
-    if len(rows) > 0:
-        print(f"  Promedio de audios por entrada: {total_generated / len(rows):.1f}")
+    print(f"  Total de entradas procesadas: {total_rows}")
+    if total_rows > 0:
+        print(f"  Promedio de audios por entrada: {total_generated / total_rows:.1f}")
     print(f"  Tiempo total: {total_time/60:.2f} minutos")
-    print(f"  Velocidad: {len(rows)/(total_time/60):.1f} entradas/min")
+    print(f"  Velocidad: {total_rows/(total_time/60):.1f} entradas/min")
     print("=" * 60)
     
     return 0
 
 
 if __name__ == "__main__":
+    # Configure UTF-8 encoding for Windows
+    if sys.platform == "win32" and hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+        sys.stderr.reconfigure(encoding="utf-8")
+    
     sys.exit(main())
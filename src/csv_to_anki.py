@@ -4,68 +4,136 @@ Generates three types of cards: SentenceCard, PatternCard, and AudioCard.
 """
 
 import argparse
+import bisect
+import contextlib
 import csv
 import hashlib
+import itertools
 import json
 import os
 import sys
 import random
+import re
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional: faster read/write of the notes cache
+    orjson = None
+
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    _loads = json.loads  # accepts UTF-8 bytes directly
 
 # Import our modules
-from anki.api import ensure_deck, post, find_audio_for_sentence, find_audio_for_word, DECK_NAME
+from anki.api import ensure_deck, get_deck_and_model_names, post, post_multi, find_audio_for_sentence, find_audio_for_word, DECK_NAME
 from anki.models import setup_models
-from anki.hints import build_hints, lookup_pos, lookup_register, lookup_frequency, clean_pinyin_from_sentence, oculta_objetivo_en_texto
+from anki.hints import build_card_hints, lookup_pos, lookup_register, lookup_frequency, clean_pinyin_from_sentence, oculta_objetivo_en_texto
 
 
-def generate_sort_key(frecuencia: str) -> str:
-    """Generate a sort key based on HSK level, frequency bucket, and random order.
-    
-    Format: {HSK_level:02d}{freq_bucket:02d}{random:04d}
+# Minimum rows before note building is spread over processes (below this,
+# starting the workers costs more than it saves)
+PARALLEL_MIN_ROWS = 1000
+
+# addNotes batches sent together in one multi request
+BATCHES_PER_REQUEST = 10
+
+# Notes checked per canAddNotes request before storing their audio
+CAN_ADD_BATCH_SIZE = 500
+
+# Audio directory (absolute path), resolved once
+AUDIO_DIR_ABS = os.path.abspath("resources/audios")
+
+# One ";"-separated tag, without the whitespace around it (same result as
+# [t.strip() for t in text.split(";") if t.strip()], but in a single scan)
+_TAG_RE = re.compile(r"[^;\s](?:[^;]*[^;\s])?")
+
+# Frequency tag -> two-digit bucket used in the SortKey (99 = unknown)
+FREQ_BUCKETS = {
+    "top1k": 1,
+    "top3k": 3,
+    "top5k": 5,
+    "top10k": 10,
+    "rare": 90
+}
+
+
+def parse_frecuencia(frecuencia: str) -> Tuple[int, int, List[str]]:
+    """Parse a frecuencia field in a single pass.
     
     Args:
         frecuencia: String like "hsk:2;freq:top1k" or "hsk:7;freq:rare"
     
     Returns:
-        Sort key string like "02010123" (HSK 2, top1k, random 123)
+        Tuple of (hsk_level, freq_bucket, tags), where unknown values are 99
+        and tags is the list of non-empty stripped tags
     """
-    # Parse HSK level
     hsk_level = 99  # Default for unknown
-    if frecuencia:
-        for tag in frecuencia.split(";"):
-            tag = tag.strip()
-            if tag.startswith("hsk:"):
-                try:
-                    hsk_level = int(tag.split(":")[1])
-                except (ValueError, IndexError):
-                    pass
-    
-    # Parse frequency bucket
     freq_bucket = 99  # Default for unknown
-    freq_map = {
-        "top1k": 1,
-        "top3k": 3,
-        "top5k": 5,
-        "top10k": 10,
-        "rare": 90
-    }
+    tags = []
+    rest = frecuencia
+    while rest:
+        tag, _, rest = rest.partition(";")
+        tag = tag.strip()
+        if not tag:
+            continue
+        tags.append(tag)
+        if tag.startswith("hsk:"):
+            try:
+                hsk_level = int(tag[4:].partition(":")[0])
+            except ValueError:
+                pass
+        elif tag.startswith("freq:"):
+            freq_bucket = FREQ_BUCKETS.get(tag[5:].partition(":")[0], 99)
+    return hsk_level, freq_bucket, tags
+
+
+def generate_sort_key(hsk_level: int, freq_bucket: int) -> str:
+    """Generate a sort key based on HSK level, frequency bucket, and random order.
     
-    if frecuencia:
-        for tag in frecuencia.split(";"):
-            tag = tag.strip()
-            if tag.startswith("freq:"):
-                freq_name = tag.split(":")[1]
-                freq_bucket = freq_map.get(freq_name, 99)
+    Format: {HSK_level:02d}{freq_bucket:02d}{random:04d}
     
-    # Generate random number for ordering within same bucket
-    random_num = random.randint(0, 9999)
+    Args:
+        hsk_level: HSK level as returned by parse_frecuencia
+        freq_bucket: Frequency bucket as returned by parse_frecuencia
+    
+    Returns:
+        Sort key string like "02010123" (HSK 2, top1k, random 123)
+    """
+    # Random number for ordering within same bucket
+    random_num = random.randrange(10000)
     
     # Format: HSK (2 digits) + Freq (2 digits) + Random (4 digits)
-    sort_key = f"{hsk_level:02d}{freq_bucket:02d}{random_num:04d}"
+    return "%02d%02d%04d" % (hsk_level, freq_bucket, random_num)
+
+
+def _make_note(model_name: str, fields: Dict[str, str], tags: List[str],
+               audio_path: Optional[str], word_audio_path: Optional[str]) -> Dict:
+    """Build an addNotes note, attaching the sentence and word audio files that were found."""
+    note = {
+        "deckName": DECK_NAME,
+        "modelName": model_name,
+        "fields": fields,
+        "options": {"allowDuplicate": False},
+        "tags": tags,
+    }
+    
+    audio_list = []
+    if audio_path:
+        audio_list.append({"path": audio_path, "filename": os.path.basename(audio_path), "fields": ["Audio"]})
+    if word_audio_path:
+        audio_list.append({"path": word_audio_path, "filename": os.path.basename(word_audio_path), "fields": ["WordAudio"]})
+    if audio_list:
+        note["audio"] = audio_list
     
-    return sort_key
+    return note
 
 
 def build_notes_from_row(row: Dict[str, str]) -> List[Dict]:
@@ -82,12 +150,13 @@ def build_notes_from_row(row: Dict[str, str]) -> List[Dict]:
     tags_seed = (row.get("tags_seed") or "").strip()
     frecuencia = (row.get("frecuencia") or "").strip()
     
+    hsk_level, freq_bucket, frecuencia_tags = parse_frecuencia(frecuencia)
+    
     # Build combined tags
     all_tags = []
     if tags_seed:
-        all_tags.extend([t.strip() for t in tags_seed.split(";") if t.strip()])
-    if frecuencia:
-        all_tags.extend([t.strip() for t in frecuencia.split(";") if t.strip()])
+        all_tags.extend(_TAG_RE.findall(tags_seed))
+    all_tags.extend(frecuencia_tags)
     if register:
         all_tags.append(register)
     combined_tags = ";".join(all_tags)
@@ -102,17 +171,37 @@ def build_notes_from_row(row: Dict[str, str]) -> List[Dict]:
     if not all_sentences_es:
         all_sentences_es = [""]
     
-    # Ensure both lists have the same size
-    while len(all_sentences_es) < len(all_sentences_cn):
-        all_sentences_es.append(all_sentences_es[-1] if all_sentences_es else "")
-    
-    # Audio directory (absolute path)
-    audio_dir_abs = os.path.abspath("resources/audios")
+    # Ensure both lists have the same size (repeat the last translation)
+    missing = len(all_sentences_cn) - len(all_sentences_es)
+    if missing > 0:
+        all_sentences_es.extend([all_sentences_es[-1]] * missing)
     
     # Build readable versions for card backs
     pos_readable = lookup_pos(pos) if pos else ""
     register_readable = lookup_register(register) if register else ""
     frecuencia_readable = lookup_frequency(frecuencia) if frecuencia else ""
+    
+    # Word audio is the same for all three cards
+    # (found paths come from a scan of the audio directory, so they exist)
+    audio_path_word = find_audio_for_word(hanzi, audio_dir=AUDIO_DIR_ABS)
+    
+    # Hints for the three cards, built in one go
+    hint_data_sentence, hint_data_definition = build_card_hints(row, hanzi, pinyin)
+    
+    # Fields and tags shared by the three cards
+    base_fields = {
+        "Hanzi": hanzi,
+        "Pinyin": pinyin,
+        "Meaning": meaning,
+        "Tips": tips,
+        "POS": pos_readable,
+        "Register": register_readable,
+        "Frecuencia": frecuencia_readable,
+        "Tags": combined_tags,
+        "Audio": "",
+        "WordAudio": "",
+    }
+    row_anki_tags = [t.replace(":", "-") for t in all_tags]
 
     notes = []
 
@@ -122,57 +211,24 @@ def build_notes_from_row(row: Dict[str, str]) -> List[Dict]:
     sent_cn_sentence = all_sentences_cn[idx_sentence]
     sent_es_sentence = all_sentences_es[idx_sentence]
     
-    # Build hints (don't hide word in collocation for SentenceCard)
-    hint_data_sentence = build_hints(row, hanzi, pinyin, hide_word_in_collocation=False)
-    
-    # Find audio for sentence and word
-    audio_path_sentence = find_audio_for_sentence(sent_cn_sentence, audio_dir=audio_dir_abs)
-    audio_filename_sentence = os.path.basename(audio_path_sentence) if audio_path_sentence else ""
-    
-    audio_path_word = find_audio_for_word(hanzi, audio_dir=audio_dir_abs)
-    audio_filename_word = os.path.basename(audio_path_word) if audio_path_word else ""
+    # Find audio for sentence
+    audio_path_sentence = find_audio_for_sentence(sent_cn_sentence, audio_dir=AUDIO_DIR_ABS)
     
     front_line = f"{sent_cn_sentence} → ¿Qué es {hanzi}?"
     fields_sentence = {
-        "Hanzi": hanzi,
-        "Pinyin": pinyin,
-        "Meaning": meaning,
+        **base_fields,
         "SentenceCN": sent_cn_sentence,
         "SentenceES": sent_es_sentence,
-        "Tips": tips,
         "Collocations": colloc,
-        "POS": pos_readable,
-        "Register": register_readable,
-        "Frecuencia": frecuencia_readable,
-        "Tags": combined_tags,
-        "Audio": "",
-        "WordAudio": "",
         "FrontLine": front_line,
         "Hint1": hint_data_sentence["hint1"],
         "Hint2": hint_data_sentence["hint2"],
         "Hint3": hint_data_sentence["hint3"],
-        "SortKey": generate_sort_key(frecuencia)
+        "SortKey": generate_sort_key(hsk_level, freq_bucket)
     }
     
-    anki_tags = ["SRS", "Sentence"] + [t.replace(":", "-") for t in all_tags]
-    note_sentence = {
-        "deckName": DECK_NAME,
-        "modelName": "ChinoSRS_SentenceCard",
-        "fields": fields_sentence,
-        "options": {"allowDuplicate": False},
-        "tags": anki_tags,
-    }
-    
-    # Add audio files
-    audio_list = []
-    if audio_path_sentence and os.path.isfile(audio_path_sentence):
-        audio_list.append({"path": audio_path_sentence, "filename": audio_filename_sentence, "fields": ["Audio"]})
-    if audio_path_word and os.path.isfile(audio_path_word):
-        audio_list.append({"path": audio_path_word, "filename": audio_filename_word, "fields": ["WordAudio"]})
-    if audio_list:
-        note_sentence["audio"] = audio_list
-    
-    notes.append(note_sentence)
+    anki_tags = ["SRS", "Sentence"] + row_anki_tags
+    notes.append(_make_note("ChinoSRS_SentenceCard", fields_sentence, anki_tags, audio_path_sentence, audio_path_word))
 
     # ===== PatternCard =====
     # Use second sentence (or first if only one exists)
@@ -183,55 +239,28 @@ def build_notes_from_row(row: Dict[str, str]) -> List[Dict]:
     # Build cloze sentence
     cloze_sentence = oculta_objetivo_en_texto(sent_cn_pattern, hanzi)
     
-    # Build hints (include definition for PatternCard)
-    hint_data_pattern = build_hints(row, hanzi, pinyin, include_definition=True)
+    # Hints include definition for PatternCard
+    hint_data_pattern = hint_data_definition
     
-    # Find audio for sentence and word
-    audio_path_pattern = find_audio_for_sentence(sent_cn_pattern, audio_dir=audio_dir_abs)
-    audio_filename_pattern = os.path.basename(audio_path_pattern) if audio_path_pattern else ""
+    # Find audio for sentence
+    audio_path_pattern = find_audio_for_sentence(sent_cn_pattern, audio_dir=AUDIO_DIR_ABS)
     
     fields_pattern = {
-        "Hanzi": hanzi,
-        "Pinyin": pinyin,
-        "Meaning": meaning,
+        **base_fields,
         "SentenceCN": sent_cn_pattern,
         "SentenceES": sent_es_pattern,
-        "Tips": tips,
         "Pattern": pattern,
-        "POS": pos_readable,
-        "Register": register_readable,
-        "Frecuencia": frecuencia_readable,
-        "Audio": "",
-        "WordAudio": "",
-        "Tags": combined_tags,
         "ClozeSentence": cloze_sentence,
         "MissingPart": hanzi,
         "Hint1": hint_data_pattern["hint1"],
         "Hint2": hint_data_pattern["hint2"],
         "Hint3": hint_data_pattern["hint3"],
         "Hint4": hint_data_pattern.get("hint4", ""),
-        "SortKey": generate_sort_key(frecuencia)
+        "SortKey": generate_sort_key(hsk_level, freq_bucket)
     }
     
-    anki_tags = ["SRS", "Pattern"] + [t.replace(":", "-") for t in all_tags]
-    note_pattern = {
-        "deckName": DECK_NAME,
-        "modelName": "ChinoSRS_PatternCard",
-        "fields": fields_pattern,
-        "options": {"allowDuplicate": False},
-        "tags": anki_tags,
-    }
-    
-    # Add audio files
-    audio_list = []
-    if audio_path_pattern and os.path.isfile(audio_path_pattern):
-        audio_list.append({"path": audio_path_pattern, "filename": audio_filename_pattern, "fields": ["Audio"]})
-    if audio_path_word and os.path.isfile(audio_path_word):
-        audio_list.append({"path": audio_path_word, "filename": audio_filename_word, "fields": ["WordAudio"]})
-    if audio_list:
-        note_pattern["audio"] = audio_list
-    
-    notes.append(note_pattern)
+    anki_tags = ["SRS", "Pattern"] + row_anki_tags
+    notes.append(_make_note("ChinoSRS_PatternCard", fields_pattern, anki_tags, audio_path_pattern, audio_path_word))
 
     # ===== AudioCard =====
     # Use third sentence (or second/first if not enough)
@@ -239,52 +268,25 @@ def build_notes_from_row(row: Dict[str, str]) -> List[Dict]:
     sent_cn_audio = all_sentences_cn[idx_audio]
     sent_es_audio = all_sentences_es[idx_audio]
     
-    # Build hints (include definition for AudioCard)
-    hint_data_audio = build_hints(row, hanzi, pinyin, include_definition=True)
+    # Hints include definition for AudioCard
+    hint_data_audio = hint_data_definition
     
-    # Find audio for sentence and word
-    audio_path_audio = find_audio_for_sentence(sent_cn_audio, audio_dir=audio_dir_abs)
-    audio_filename_audio = os.path.basename(audio_path_audio) if audio_path_audio else ""
+    # Find audio for sentence
+    audio_path_audio = find_audio_for_sentence(sent_cn_audio, audio_dir=AUDIO_DIR_ABS)
     
     fields_audio = {
-        "Hanzi": hanzi,
-        "Pinyin": pinyin,
-        "Meaning": meaning,
+        **base_fields,
         "SentenceCN": sent_cn_audio,
         "SentenceES": sent_es_audio,
-        "Tips": tips,
-        "POS": pos_readable,
-        "Register": register_readable,
-        "Frecuencia": frecuencia_readable,
-        "Tags": combined_tags,
-        "Audio": "",
-        "WordAudio": "",
         "Hint1": hint_data_audio["hint1"],
         "Hint2": hint_data_audio["hint2"],
         "Hint3": hint_data_audio["hint3"],
         "Hint4": hint_data_audio.get("hint4", ""),
-        "SortKey": generate_sort_key(frecuencia)
-    }
-    
-    anki_tags = ["SRS", "Audio"] + [t.replace(":", "-") for t in all_tags]
-    note_audio = {
-        "deckName": DECK_NAME,
-        "modelName": "ChinoSRS_AudioCard",
-        "fields": fields_audio,
-        "options": {"allowDuplicate": False},
-        "tags": anki_tags,
+        "SortKey": generate_sort_key(hsk_level, freq_bucket)
     }
     
-    # Add audio files
-    audio_list = []
-    if audio_path_audio and os.path.isfile(audio_path_audio):
-        audio_list.append({"path": audio_path_audio, "filename": audio_filename_audio, "fields": ["Audio"]})
-    if audio_path_word and os.path.isfile(audio_path_word):
-        audio_list.append({"path": audio_path_word, "filename": audio_filename_word, "fields": ["WordAudio"]})
-    if audio_list:
-        note_audio["audio"] = audio_list
-    
-    notes.append(note_audio)
+    anki_tags = ["SRS", "Audio"] + row_anki_tags
+    notes.append(_make_note("ChinoSRS_AudioCard", fields_audio, anki_tags, audio_path_audio, audio_path_word))
 
     return notes
 
@@ -309,6 +311,25 @@ def get_cache_filename(csv_file: str) -> str:
     return os.path.join(cache_dir, f"{name_without_ext}.json")
 
 
+def write_notes_json(notes: List[Dict], path: str) -> None:
+    """Write notes as a compact JSON array with one note per line.
+    
+    Still loadable with json.load, but much smaller and faster to write
+    than indent=2.
+    
+    Args:
+        notes: List of Anki note dictionaries
+        path: Output file path
+    """
+    with open(path, "wb") as f:
+        f.write(b"[\n")
+        last = len(notes) - 1
+        for i, note in enumerate(notes):
+            f.write(_dumps(note))
+            f.write(b",\n" if i < last else b"\n")
+        f.write(b"]\n")
+
+
 def save_notes_to_cache(notes: List[Dict], cache_file: str) -> None:
     """Save generated notes to JSON cache file.
     
@@ -317,8 +338,7 @@ def save_notes_to_cache(notes: List[Dict], cache_file: str) -> None:
         cache_file: Path to cache file
     """
     print(f"\nGuardando {len(notes)} notas en caché: {cache_file}")
-    with open(cache_file, "w", encoding="utf-8") as f:
-        json.dump(notes, f, ensure_ascii=False, indent=2)
+    write_notes_json(notes, cache_file)
     print(f"Caché guardado exitosamente.")
 
 
@@ -332,8 +352,8 @@ def load_notes_from_cache(cache_file: str) -> List[Dict]:
         List of Anki note dictionaries
     """
     print(f"Cargando notas desde caché: {cache_file}")
-    with open(cache_file, "r", encoding="utf-8") as f:
-        notes = json.load(f)
+    with open(cache_file, "rb") as f:
+        notes = _loads(f.read())
     print(f"Cargadas {len(notes)} notas desde caché.")
     return notes
 
@@ -375,8 +395,33 @@ def deduplicate_sort_keys(notes: List[Dict]) -> tuple[List[Dict], List[Dict]]:
     total_duplicates = sum(len(v) - 1 for v in duplicate_groups.values())
     print(f"   Total de notas a desduplicar: {total_duplicates}")
     
-    # Track all used SortKeys
-    used_sortkeys = set(sortkey_map.keys())
+    # Free random slots per bucket ("HHFF" prefix), as sorted lists built on
+    # first use, so finding the next free key is a bisect instead of probing
+    # every taken key one by one
+    used_by_bucket = {}
+    for key in sortkey_map:
+        if len(key) == 8 and key.isdigit():
+            used_by_bucket.setdefault(key[:4], set()).add(int(key[4:]))
+    free_slots = {}
+    
+    max_sequential_attempts = 1000  # How far past the start a slot may be in the same bucket
+    
+    def take_slot(bucket_key: str, start: int):
+        """Take the first free slot at or after start (wrapping around), or None if it is too far."""
+        slots = free_slots.get(bucket_key)
+        if slots is None:
+            used = used_by_bucket.get(bucket_key, ())
+            slots = free_slots[bucket_key] = [n for n in range(10000) if n not in used]
+        if not slots:
+            return None
+        pos = bisect.bisect_left(slots, start)
+        if pos == len(slots):
+            pos = 0
+        slot = slots[pos]
+        if (slot - start) % 10000 > max_sequential_attempts:
+            return None
+        del slots[pos]
+        return slot
     
     # Second pass: fix duplicates (only process groups with duplicates)
     duplicates_found = 0
@@ -384,14 +429,13 @@ def deduplicate_sort_keys(notes: List[Dict]) -> tuple[List[Dict], List[Dict]]:
     for sortkey, indices in duplicate_groups.items():
         groups_processed += 1
         
-        # Show progress every 10 groups
-        if groups_processed % 10 == 0 or groups_processed == len(duplicate_groups):
+        # Show progress every 1000 groups
+        if groups_processed % 1000 == 0 or groups_processed == len(duplicate_groups):
             print(f"   Procesando grupo {groups_processed}/{len(duplicate_groups)}...", end="\r")
         
         # Parse the original key components once
         hsk = sortkey[:2]
         freq = sortkey[2:4]
-        bucket_key = f"{hsk}{freq}"
         base_random = int(sortkey[4:8])
         
         # Check bucket saturation
@@ -400,45 +444,32 @@ def deduplicate_sort_keys(notes: List[Dict]) -> tuple[List[Dict], List[Dict]]:
             print(f"\n   ⚠️  Grupo grande detectado: {sortkey} con {num_duplicates} duplicados")
         
         # Keep first occurrence, modify the rest
-        offset = 1
+        start = (base_random + 1) % 10000
         current_freq = int(freq)
-        max_sequential_attempts = 1000  # Try to find slot in current bucket
         
-        for i, note_idx in enumerate(indices[1:], start=1):
+        for note_idx in indices[1:]:
             duplicates_found += 1
             deduplicated_indices.add(note_idx)
             note = notes[note_idx]
             
-            # Try to find available slot
-            attempts = 0
-            found_slot = False
-            
-            while not found_slot:
-                new_random = (base_random + offset) % 10000
+            # Find available slot, moving to the next frequency bucket if
+            # the current one has no free slot close enough
+            while True:
                 current_freq_str = f"{current_freq:02d}"
-                new_key = f"{hsk}{current_freq_str}{new_random:04d}"
+                new_random = take_slot(f"{hsk}{current_freq_str}", start)
+                if new_random is not None:
+                    break
+                current_freq += 1
+                start = base_random
+                print(f"\n   ⚠️  Bucket {hsk}{freq} saturado, moviendo a {hsk}{current_freq:02d}...")
                 
-                if new_key not in used_sortkeys:
-                    # Found available slot
-                    found_slot = True
-                    note["fields"]["SortKey"] = new_key
-                    used_sortkeys.add(new_key)
-                    offset += 1
-                else:
-                    offset += 1
-                    attempts += 1
-                    
-                    # If current bucket is saturated, move to next frequency bucket
-                    if attempts > max_sequential_attempts:
-                        current_freq += 1
-                        offset = 0  # Reset offset for new bucket
-                        attempts = 0
-                        print(f"\n   ⚠️  Bucket {hsk}{freq} saturado, moviendo a {hsk}{current_freq:02d}...")
-                        
-                        # Safety check - don't go beyond 99
-                        if current_freq > 99:
-                            print(f"\n   ❌ ERROR: No hay buckets disponibles")
-                            raise RuntimeError(f"Todos los buckets HSK {hsk} están saturados")
+                # Safety check - don't go beyond 99
+                if current_freq > 99:
+                    print(f"\n   ❌ ERROR: No hay buckets disponibles")
+                    raise RuntimeError(f"Todos los buckets HSK {hsk} están saturados")
+            
+            note["fields"]["SortKey"] = f"{hsk}{current_freq_str}{new_random:04d}"
+            start = (new_random + 1) % 10000
     
     print(f"\n✅ Desduplicados {duplicates_found} SortKeys")
     
@@ -448,22 +479,179 @@ def deduplicate_sort_keys(notes: List[Dict]) -> tuple[List[Dict], List[Dict]]:
     return notes, deduplicated_notes
 
 
-def main():
+def store_note_audio(notes: List[Dict], batch_size: int = 100) -> None:
+    """Store the notes' audio files in Anki once each and reference them from the fields.
+    
+    The three cards of a row share the same word audio, so letting addNotes
+    handle each note's "audio" list reads and stores that file three times.
+    Each unique file is sent with storeMediaFile instead, and the notes get
+    the [sound:...] tag that addNotes would have added. Files that fail to
+    store stay in the note's "audio" list, so addNotes reports them as before.
+    
+    Only notes that canAddNotes accepts are handled here: addNotes never
+    stores media for a duplicate, so re-running against an existing deck
+    must not re-upload the audio of notes that are already there. Notes that
+    can't be checked keep their "audio" list too.
+    
+    Args:
+        notes: Notes to upload (modified in place)
+        batch_size: storeMediaFile actions per multi request
+    """
+    addable = []
+    for i in range(0, len(notes), CAN_ADD_BATCH_SIZE):
+        chunk = notes[i:i + CAN_ADD_BATCH_SIZE]
+        if not any(note.get("audio") for note in chunk):
+            continue
+        try:
+            can_add = post("canAddNotes", notes=chunk)
+        except Exception as e:
+            print(f"⚠️  No se pudo comprobar qué notas son nuevas: {str(e)[:200]}")
+            continue
+        addable.extend(note for note, ok in zip(chunk, can_add) if ok)
+    
+    filenames = {}  # path -> filename
+    for note in addable:
+        for media in note.get("audio", ()):
+            filenames.setdefault(media["path"], media["filename"])
+    if not filenames:
+        return
+    
+    print(f"Subiendo {len(filenames)} archivos de audio...")
+    paths = list(filenames)
+    stored = {}  # path -> filename in Anki's media folder
+    for i in range(0, len(paths), batch_size):
+        chunk = paths[i:i + batch_size]
+        actions = [{"action": "storeMediaFile", "params": {"filename": filenames[path], "path": path}}
+                   for path in chunk]
+        try:
+            stored.update(zip(chunk, post_multi(actions)))
+        except Exception as e:
+            print(f"⚠️  No se pudieron subir {len(chunk)} audios por adelantado: {str(e)[:200]}")
+    
+    for note in addable:
+        audio_list = note.get("audio")
+        if not audio_list:
+            continue
+        remaining = []
+        for media in audio_list:
+            stored_name = stored.get(media["path"])
+            if stored_name is None:
+                remaining.append(media)
+                continue
+            for field in media["fields"]:
+                note["fields"][field] += f"[sound:{stored_name}]"
+        if remaining:
+            note["audio"] = remaining
+        else:
+            del note["audio"]
+
+
+def add_notes_multi(batches: List[List[Dict]]) -> List:
+    """Send several addNotes batches in a single multi request.
+    
+    Args:
+        batches: Lists of notes, one addNotes call each
+    
+    Returns:
+        One item per batch: the addNotes result, or the exception for that
+        batch, so each batch can still be reported (and bisected) on its own
+    """
+    actions = [{"action": "addNotes", "version": 6, "params": {"notes": batch}} for batch in batches]
+    try:
+        responses = post("multi", actions=actions)
+    except Exception:
+        # The whole request failed, so no batch has a result of its own:
+        # send them one by one, and only the batches that fail by themselves
+        # are left for find_failing_note
+        results = []
+        for batch in batches:
+            try:
+                results.append(post("addNotes", notes=batch))
+            except Exception as e:
+                results.append(e)
+        return results
+    
+    results = []
+    for response in responses:
+        error = response.get("error")
+        result = response.get("result")
+        # Duplicates come back as None entries in the result, like in post()
+        if error is not None and "duplicate" not in str(error).lower():
+            results.append(RuntimeError(f"AnkiConnect error in addNotes: {error}"))
+        elif result is None:
+            results.append(RuntimeError(f"AnkiConnect returned None for addNotes: {error}"))
+        else:
+            results.append(result)
+    return results
+
+
+def add_notes_each(notes: List[Dict]) -> List[Tuple[Optional[int], Optional[str]]]:
+    """Add notes with one addNote action each, in a single multi request.
+    
+    Unlike addNotes, this gives every note its own error, so a note rejected
+    as a duplicate can be told apart from one that is invalid.
+    
+    Returns:
+        One (note id, error) tuple per note
+    """
+    responses = post("multi", actions=[{"action": "addNote", "params": {"note": note}} for note in notes])
+    return [(response.get("result"), response.get("error")) for response in responses]
+
+
+def find_failing_note(batch: List[Dict]) -> Tuple[int, List[int], Optional[Exception]]:
+    """Find the first note in a batch that makes addNotes fail, by bisection.
+    
+    The notes are sent half of what is left at a time (left half first), with
+    add_notes_each so each note's error is known: duplicates are collected and
+    the first other error is the culprit. As when probing one note at a time,
+    notes before the culprit are added to Anki, and the notes after the half
+    that holds it are not sent.
+    
+    The errors are checked per note rather than through post("addNotes"),
+    which returns normally when the error text mentions a duplicate: after a
+    failed batch, most of its notes already are in Anki, so a probe holding
+    the culprit would also hold duplicates and look like it went through.
+    
+    Args:
+        batch: Notes of the batch that failed
+    
+    Returns:
+        Tuple of (index of the failing note, indices of notes rejected as
+        duplicates, error). Index and error are -1/None if no note failed.
+    """
+    duplicate_idxs = []
+    start, end = 0, len(batch)
+    while start < end:
+        mid = start + max(1, (end - start) // 2)
+        for idx, (_, error) in enumerate(add_notes_each(batch[start:mid]), start):
+            if error is None:
+                continue
+            if "duplicate" in str(error).lower():
+                duplicate_idxs.append(idx)
+            else:
+                return idx, duplicate_idxs, RuntimeError(f"AnkiConnect error in addNote: {error}")
+        start = mid
+    return -1, duplicate_idxs, None
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Convert CSV vocabulary to Anki notes")
     parser.add_argument("csv_file", help="Path to CSV file")
     parser.add_argument("--limit", type=int, help="Limit number of entries to process")
     parser.add_argument("--force-recreate", action="store_true", help="Force recreate card models")
     parser.add_argument("--skip-cache", action="store_true", help="Skip cache and regenerate notes from CSV")
     parser.add_argument("--only-deduplicated", action="store_true", help="Only upload notes that were deduplicated (had duplicate SortKeys)")
-    args = parser.parse_args()
+    parser.add_argument("--workers", type=int, help="Processes used to build notes from large CSVs (default: CPU count, 1 = no parallelism)")
+    args = parser.parse_args(argv)
 
     if not os.path.isfile(args.csv_file):
         print(f"Error: CSV file not found: {args.csv_file}", file=sys.stderr)
-        sys.exit(1)
+        return 1
 
     print("Setting up Anki deck and card models...")
-    ensure_deck(DECK_NAME)
-    setup_models(force_recreate=args.force_recreate)
+    deck_names, model_names = get_deck_and_model_names()
+    ensure_deck(DECK_NAME, deck_names)
+    setup_models(force_recreate=args.force_recreate, model_names=model_names)
 
     # Check if cache file exists
     cache_file = get_cache_filename(args.csv_file)
@@ -481,25 +669,37 @@ def main():
             print(f"\nOmitiendo caché (--skip-cache activado)")
         print(f"\nGenerando notas desde CSV: {args.csv_file}")
         
-        # Count total rows first
+        # Count total rows first (plain csv.reader: no dict per row, and stop
+        # at --limit; blank lines are skipped like DictReader does)
         with open(args.csv_file, "r", encoding="utf-8") as f:
-            total_rows = sum(1 for _ in csv.DictReader(f))
-            if args.limit:
-                total_rows = min(total_rows, args.limit)
+            reader = csv.reader(f)
+            next(reader, None)  # Header
+            total_rows = sum(1 for _ in itertools.islice(filter(None, reader), args.limit or None))
         
         all_notes = []
         start_time = time.time()
         last_update = start_time
         
-        with open(args.csv_file, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for i, row in enumerate(reader):
-                if args.limit and i >= args.limit:
-                    break
-                notes = build_notes_from_row(row)
+        # Rows are independent and building notes is CPU-bound, so large CSVs
+        # are spread over processes (map keeps the results in row order)
+        workers = max(1, args.workers or os.cpu_count() or 1)
+        use_processes = workers > 1 and total_rows >= PARALLEL_MIN_ROWS
+        if use_processes:
+            print(f"Procesos en paralelo: {workers}")
+        pool = ProcessPoolExecutor(max_workers=workers) if use_processes else contextlib.nullcontext()
+        
+        with open(args.csv_file, "r", encoding="utf-8") as f, pool as executor:
+            rows = itertools.islice(csv.DictReader(f), args.limit or None)
+            if executor is not None:
+                rows_notes = executor.map(build_notes_from_row, rows, chunksize=64)
+            else:
+                rows_notes = map(build_notes_from_row, rows)
+            for i, notes in enumerate(rows_notes):
                 all_notes.extend(notes)
                 
-                # Update progress every second
+                # Update progress every second (only look at the clock every 64 rows)
+                if i % 64 != 63 and i != total_rows - 1:
+                    continue
                 current_time = time.time()
                 if current_time - last_update >= 1.0 or i == total_rows - 1:
                     elapsed = current_time - start_time
@@ -507,7 +707,8 @@ def main():
                     if progress > 0:
                         eta_seconds = (elapsed / progress) - elapsed
                         eta_str = str(timedelta(seconds=int(eta_seconds)))
-                        print(f"\rProgreso: {i+1}/{total_rows} ({progress*100:.1f}%) | ETA: {eta_str}", end="", flush=True)
+                        sys.stdout.write(f"\rProgreso: {i+1}/{total_rows} ({progress*100:.1f}%) | ETA: {eta_str}")
+                        sys.stdout.flush()
                     last_update = current_time
         
         print()  # New line after progress
@@ -531,7 +732,10 @@ def main():
     
     if len(notes_to_upload) == 0:
         print("No hay notas para subir.")
-        return
+        return 0
+    
+    # Store each audio file once instead of once per card
+    store_note_audio(notes_to_upload)
     
     # Send notes in batches
     batch_size = 50
@@ -541,20 +745,29 @@ def main():
     start_time = time.time()
     total_added = 0
     total_failed = 0
+    pending_results = []
     
     for i in range(0, len(notes_to_upload), batch_size):
         batch_num = i // batch_size + 1
         batch = notes_to_upload[i:i + batch_size]
         
+        # Send the next few batches together in one multi request
+        if not pending_results:
+            group_end = i + batch_size * BATCHES_PER_REQUEST
+            pending_results = add_notes_multi([notes_to_upload[j:j + batch_size]
+                                               for j in range(i, min(group_end, len(notes_to_upload)), batch_size)])
+        
         batch_start = time.time()
         
         try:
-            result = post("addNotes", notes=batch)
+            result = pending_results.pop(0)
+            if isinstance(result, Exception):
+                raise result
             batch_time = time.time() - batch_start
             
             # Count successful and failed notes
-            added = sum(1 for r in result if r is not None)
-            failed = len(result) - added
+            failed = result.count(None)
+            added = len(result) - failed
             total_added += added
             total_failed += failed
             
@@ -582,32 +795,29 @@ def main():
             # Save problematic batch for inspection
             problem_file = f"outputs/batch_{batch_num}_error.json"
             try:
-                with open(problem_file, "w", encoding="utf-8") as f:
-                    json.dump(batch, f, ensure_ascii=False, indent=2)
+                write_notes_json(batch, problem_file)
                 print(f"💾 Batch problemático guardado en: {problem_file}")
                 
                 # Try to identify which specific note(s) in the batch are problematic
                 print(f"\n🔍 Intentando identificar nota problemática...")
-                for idx, note in enumerate(batch):
-                    note_num = i + idx + 1
-                    try:
-                        # Try to add this single note
-                        single_result = post("addNotes", notes=[note])
-                        if single_result is None or single_result[0] is None:
-                            print(f"   ⚠️  Nota #{note_num} falló (posible duplicado)")
-                            print(f"      Hanzi: {note['fields'].get('Hanzi', 'N/A')}")
-                            print(f"      Model: {note.get('modelName', 'N/A')}")
-                    except Exception as single_e:
-                        print(f"   ❌ Nota #{note_num} causó error:")
-                        print(f"      Hanzi: {note['fields'].get('Hanzi', 'N/A')}")
-                        print(f"      Model: {note.get('modelName', 'N/A')}")
-                        print(f"      Error: {str(single_e)[:200]}")
-                        # Save the specific problematic note
-                        problem_note_file = f"outputs/note_{note_num}_error.json"
-                        with open(problem_note_file, "w", encoding="utf-8") as nf:
-                            json.dump(note, nf, ensure_ascii=False, indent=2)
-                        print(f"      Guardada en: {problem_note_file}")
-                        break  # Stop after finding first problematic note
+                bad_idx, duplicate_idxs, single_e = find_failing_note(batch)
+                for idx in duplicate_idxs:
+                    note = batch[idx]
+                    print(f"   ⚠️  Nota #{i + idx + 1} falló (posible duplicado)")
+                    print(f"      Hanzi: {note['fields'].get('Hanzi', 'N/A')}")
+                    print(f"      Model: {note.get('modelName', 'N/A')}")
+                if single_e is not None:
+                    note = batch[bad_idx]
+                    note_num = i + bad_idx + 1
+                    print(f"   ❌ Nota #{note_num} causó error:")
+                    print(f"      Hanzi: {note['fields'].get('Hanzi', 'N/A')}")
+                    print(f"      Model: {note.get('modelName', 'N/A')}")
+                    print(f"      Error: {str(single_e)[:200]}")
+                    # Save the specific problematic note
+                    problem_note_file = f"outputs/note_{note_num}_error.json"
+                    with open(problem_note_file, "w", encoding="utf-8") as nf:
+                        json.dump(note, nf, ensure_ascii=False, indent=2)
+                    print(f"      Guardada en: {problem_note_file}")
                 print()
             except Exception as save_error:
                 print(f"⚠️  No se pudo guardar el batch: {save_error}\n")
@@ -621,7 +831,8 @@ def main():
     print(f"  - Notas agregadas: {total_added}")
     print(f"  - Notas fallidas/duplicadas: {total_failed}")
     print(f"  - Total procesadas: {total_added + total_failed}")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
@@ -1,15 +1,66 @@
 import argparse
+import codecs
 import csv
+import hashlib
+import itertools
 import json
 import os
+import random
+import re
+import sqlite3
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import requests
-
-API_URL = "https://api.openai.com/v1/chat/completions"
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:  # optional: faster JSON parsing of entries and API responses
+    orjson = None
+
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+    _loads = json.loads  # accepts UTF-8 bytes directly
+
+try:
+    import ijson
+except ImportError:  # optional: stream large entry files instead of loading them whole
+    ijson = None
+
+API_BASE = "https://api.openai.com/v1"
+API_URL = f"{API_BASE}/chat/completions"
 DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_CONCURRENCY = 20  # Peticiones en vuelo a la vez (limitado por RPM/TPM de la cuenta)
+DEFAULT_ENTRIES_PER_REQUEST = 1  # Palabras por petición (realtime)
+
+# Reintentos ante límites de tasa (429) y errores transitorios del servidor o de red
+MAX_ATTEMPTS = 5
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_MAX_WAIT = 30  # segundos
+
+RESPONSE_CACHE = "outputs/openai_cache.sqlite"  # Respuestas ya generadas (reejecuciones gratis)
+FLUSH_EVERY = 50  # Filas escritas entre flushes del CSV de salida
+
+# Batch API: mitad de precio, resultados en menos de 24h
+BATCH_POLL_SECONDS = 60
+
+# Shared session so calls reuse keep-alive connections instead of doing a new
+# TCP+TLS handshake each time. The pool is sized above DEFAULT_CONCURRENCY.
+# Retries are handled in _post_with_retry, not by the adapter.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=50, pool_maxsize=50))
+
+# HSK level strings like "new-3", "old-2", "new-7+"
+_LEVEL_RE = re.compile(r"(new|old)-(\d+)\+*")
 
 CSV_HEADER = [
     "hanzi",
@@ -52,25 +103,16 @@ SYSTEM_PROMPT = (
 def get_hsk_from_levels(levels):
     if not levels:
         return None
-    best_new = None
-    best_old = None
+    best = {"new": None, "old": None}
     for lv in levels:
-        if isinstance(lv, str):
-            if lv.startswith("new-"):
-                tail = lv[4:].rstrip('+')  # Remove trailing + if present
-                if tail.isdigit():
-                    n = int(tail)
-                    if best_new is None or n < best_new:
-                        best_new = n
-            elif lv.startswith("old-"):
-                tail = lv[4:].rstrip('+')
-                if tail.isdigit():
-                    n = int(tail)
-                    if best_old is None or n < best_old:
-                        best_old = n
+        m = _LEVEL_RE.fullmatch(lv) if isinstance(lv, str) else None
+        if m:
+            kind, n = m.group(1), int(m.group(2))
+            if best[kind] is None or n < best[kind]:
+                best[kind] = n
     # Prefer new, fallback to old
-    best = best_new if best_new is not None else best_old
-    return f"hsk:{best}" if best else None
+    v = best["new"] if best["new"] is not None else best["old"]
+    return f"hsk:{v}" if v else None
 
 
 def get_freq_bucket(rank):
@@ -91,33 +133,87 @@ def fix_encoding(text):
     """Fix mojibake by re-encoding latin-1 as utf-8"""
     if not text or not isinstance(text, str):
         return text
+    # Plain ASCII round-trips unchanged, and anything beyond latin-1 (e.g.
+    # correctly decoded hanzi) can't be encoded: skip both without the round-trip
+    if text.isascii() or max(text) > '\xff':
+        return text
     try:
         return text.encode('latin-1').decode('utf-8')
     except (UnicodeDecodeError, UnicodeEncodeError):
         return text
 
 
-def read_entries(input_path):
+def _iter_json_file(fp):
+    """Yield the entries of one JSON file (a list of entries or a single entry).
+    Top-level lists are streamed with ijson when it is installed."""
+    with fp.open("rb") as f:
+        head = f.read(64)
+        has_bom = head.startswith(codecs.BOM_UTF8)
+        if has_bom:
+            head = head[3:]
+        if ijson is not None and head.lstrip()[:1] == b"[":
+            f.seek(3 if has_bom else 0)
+            yield from ijson.items(f, "item", use_float=True)
+            return
+        f.seek(0)
+        raw = f.read()
+        data = _loads(raw[3:] if raw.startswith(codecs.BOM_UTF8) else raw)
+    yield from (data if isinstance(data, list) else [data])
+
+
+def iter_entries(input_path):
+    """Yield the entries of a JSON file, or of every *.json under a folder
+    (unreadable files in a folder are skipped), one at a time."""
     p = Path(input_path)
-    items = []
     if p.is_file():
-        with p.open("r", encoding="utf-8-sig") as f:
-            data = json.load(f)
-            items.extend(data if isinstance(data, list) else [data])
+        yield from _iter_json_file(p)
     elif p.is_dir():
         for fp in sorted(p.rglob("*.json")):
             try:
-                with fp.open("r", encoding="utf-8-sig") as f:
-                    data = json.load(f)
-                items.extend(data if isinstance(data, list) else [data])
+                yield from _iter_json_file(fp)
             except Exception:
                 pass
     else:
         raise FileNotFoundError(f"Ruta no encontrada: {p}")
-    return items
 
 
-def openai_generate(api_key, model, hanzi, pinyin, pos, meanings):
+def _retry_wait(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` (1-based): the server's
+    Retry-After if it sent one, else exponential backoff with jitter."""
+    if retry_after:
+        try:
+            return min(float(retry_after), RETRY_MAX_WAIT)
+        except ValueError:
+            pass
+    return min(2 ** (attempt - 1), RETRY_MAX_WAIT) + random.uniform(0, 1)
+
+
+def _post_with_retry(headers, body):
+    """POST to the OpenAI API, retrying network errors and RETRY_STATUS responses
+    up to MAX_ATTEMPTS times. Returns the last response (which may still be an error)."""
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            r = _SESSION.post(API_URL, headers=headers, json=body, timeout=60)
+        except requests.RequestException:
+            if attempt == MAX_ATTEMPTS:
+                raise
+            time.sleep(_retry_wait(attempt))
+            continue
+        if r.status_code not in RETRY_STATUS or attempt == MAX_ATTEMPTS:
+            return r
+        time.sleep(_retry_wait(attempt, r.headers.get("Retry-After")))
+
+
+# Format reminder appended to every user message
+EXAMPLE_NOTE = (
+    "IMPORTANTE: example_sentence debe ser un array de 3 strings, cada uno SOLO con caracteres chinos.\n"
+    "Ejemplo correcto:\n"
+    '"example_sentence": ["这件首饰非常贵重。", "他把贵重的文件放在保险箱里。", "这幅画是一个贵重的艺术品。"]\n'
+    '"example_translation": ["Esta joya es muy valiosa.", "Él guardó los documentos valiosos en la caja fuerte.", "Esta pintura es una obra de arte valiosa."]'
+)
+
+
+def build_request_body(model, hanzi, pinyin, pos, meanings):
     # Create user message with example format
     user_content = (
         f"Genera contenido para:\n"
@@ -125,13 +221,30 @@ def openai_generate(api_key, model, hanzi, pinyin, pos, meanings):
         f"pinyin: {pinyin}\n"
         f"pos: {pos}\n"
         f"meanings: {meanings}\n\n"
-        f"IMPORTANTE: example_sentence debe ser un array de 3 strings, cada uno SOLO con caracteres chinos.\n"
-        f"Ejemplo correcto:\n"
-        f'"example_sentence": ["这件首饰非常贵重。", "他把贵重的文件放在保险箱里。", "这幅画是一个贵重的艺术品。"]\n'
-        f'"example_translation": ["Esta joya es muy valiosa.", "Él guardó los documentos valiosos en la caja fuerte.", "Esta pintura es una obra de arte valiosa."]'
+        + EXAMPLE_NOTE
+    )
+    return _chat_body(model, user_content)
+
+
+def build_group_request_body(model, metas):
+    """Request body asking for several entries at once, so the system prompt
+    is paid once per group. The answer is {"entries": [...]} in the same order."""
+    words = "\n".join(
+        f"{i}. hanzi: {m['hanzi']} | pinyin: {m['pinyin']} | pos: {m['pos']} | meanings: {m['meanings']}"
+        for i, m in enumerate(metas, 1)
     )
-    
-    body = {
+    user_content = (
+        f"Genera contenido para cada una de estas {len(metas)} palabras:\n"
+        f"{words}\n\n"
+        f"Devuelve un JSON con la clave \"entries\": un array de {len(metas)} objetos, en el mismo orden, "
+        f"cada uno con las claves indicadas.\n"
+        + EXAMPLE_NOTE
+    )
+    return _chat_body(model, user_content)
+
+
+def _chat_body(model, user_content):
+    return {
         "model": model,
         "temperature": 0.2,
         "response_format": {"type": "json_object"},
@@ -140,12 +253,214 @@ def openai_generate(api_key, model, hanzi, pinyin, pos, meanings):
             {"role": "user", "content": user_content},
         ],
     }
+
+
+def parse_completion(data):
+    """Generated fields from a chat completion response body."""
+    content = data["choices"][0]["message"]["content"]
+    return _loads(content)
+
+
+def body_hash(body):
+    """Stable hash of a request body (plain json with sorted keys, so it
+    doesn't depend on orjson being installed)."""
+    return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk (SQLite) cache of generated content, keyed by a hash of the full
+    request body, so rerunning on the same entries with the same model and
+    prompt doesn't pay for them again. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    _key = staticmethod(body_hash)
+
+    def get(self, body):
+        """Cached content for this request body, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (self._key(body),)).fetchone()
+        return _loads(row[0]) if row else None
+
+    def put(self, body, gen):
+        value = json.dumps(gen, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)", (self._key(body), value))
+
+def request_completion(api_key, body):
+    """Send one chat completion request and return the generated fields."""
     headers = {"Authorization": f"Bearer {api_key}"}
-    r = requests.post(API_URL, headers=headers, json=body, timeout=60)
+    r = _post_with_retry(headers, body)
     if r.status_code != 200:
         raise RuntimeError(f"OpenAI API error {r.status_code}: {r.text}")
-    content = r.json()["choices"][0]["message"]["content"]
-    return json.loads(content)
+    return parse_completion(_loads(r.content))
+
+
+def request_group_completion(api_key, model, metas):
+    """Generated fields for several entries from one request, in the same order.
+    Raises ValueError if the answer doesn't have one object per entry."""
+    gen = request_completion(api_key, build_group_request_body(model, metas))
+    entries = gen.get("entries") if isinstance(gen, dict) else None
+    if not isinstance(entries, list) or len(entries) != len(metas) or not all(isinstance(e, dict) for e in entries):
+        raise ValueError(f"respuesta agrupada inválida para {len(metas)} palabras")
+    return entries
+
+
+def _openai_request(api_key, method, path, **kwargs):
+    """Call an OpenAI endpoint other than chat completions (files, batches)."""
+    headers = {"Authorization": f"Bearer {api_key}"}
+    r = _SESSION.request(method, f"{API_BASE}{path}", headers=headers, timeout=300, **kwargs)
+    if r.status_code != 200:
+        raise RuntimeError(f"OpenAI API error {r.status_code}: {r.text}")
+    return r
+
+
+def submit_batch(api_key, model, items):
+    """Upload one chat completion request per (idx, meta) item and start a batch.
+    Returns the batch id."""
+    lines = []
+    for idx, meta in items:
+        body = build_request_body(model, meta["hanzi"], meta["pinyin"], meta["pos"], meta["meanings"])
+        lines.append(_dumps({
+            "custom_id": str(idx),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": body,
+        }))
+    jsonl = b"\n".join(lines) + b"\n"
+
+    upload = _openai_request(api_key, "POST", "/files", data={"purpose": "batch"},
+                             files={"file": ("vocab_batch.jsonl", jsonl)}).json()
+    batch = _openai_request(api_key, "POST", "/batches", json={
+        "input_file_id": upload["id"],
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h",
+    }).json()
+    return batch["id"]
+
+
+def wait_for_batch(api_key, batch_id, poll_seconds):
+    """Poll a batch until it finishes. Returns the final batch object."""
+    while True:
+        batch = _openai_request(api_key, "GET", f"/batches/{batch_id}").json()
+        status = batch.get("status")
+        counts = batch.get("request_counts") or {}
+        print(f"Batch {batch_id}: {status} | "
+              f"{counts.get('completed', 0)}/{counts.get('total', 0)} completadas, {counts.get('failed', 0)} fallidas")
+        sys.stdout.flush()
+        if status in ("completed", "failed", "expired", "cancelled"):
+            return batch
+        time.sleep(poll_seconds)
+
+
+def fetch_batch_results(api_key, batch):
+    """Map custom_id -> generated fields (or the Exception for failed requests)."""
+    results = {}
+    for key in ("output_file_id", "error_file_id"):
+        file_id = batch.get(key)
+        if not file_id:
+            continue
+        content = _openai_request(api_key, "GET", f"/files/{file_id}/content").content
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = _loads(line)
+            response = item.get("response") or {}
+            try:
+                if item.get("error") or response.get("status_code") != 200:
+                    raise RuntimeError(f"OpenAI API error {response.get('status_code')}: "
+                                       f"{item.get('error') or response.get('body')}")
+                results[item["custom_id"]] = parse_completion(response["body"])
+            except Exception as ex:
+                results[item["custom_id"]] = ex
+    return results
+
+
+def run_batch(api_key, model, items, writer, total, poll_seconds, state_path, cache=None):
+    """
+    Generate every item through the Batch API and write the rows in input order.
+    The batch id is saved to state_path while the batch runs, so an interrupted
+    run picks up the same batch instead of submitting (and paying for) a new one.
+    A saved batch is only reused if it was built from the same requests.
+    Items found in `cache` are not sent, and new results are added to it.
+    """
+    items = list(items)
+    bodies = {idx: build_request_body(model, meta["hanzi"], meta["pinyin"], meta["pos"], meta["meanings"])
+              for idx, meta in items}
+    results = {}
+    if cache is not None:
+        for idx, _ in items:
+            gen = cache.get(bodies[idx])
+            if gen is not None:
+                results[str(idx)] = gen
+        if results:
+            print(f"Respuestas en caché: {len(results)}")
+    to_send = [(idx, meta) for idx, meta in items if str(idx) not in results]
+    if to_send:
+        request_hashes = {str(idx): body_hash(bodies[idx]) for idx, _ in to_send}
+        status = _run_batch_requests(api_key, model, to_send, poll_seconds, state_path, results, request_hashes)
+        if status:
+            return status
+        if cache is not None:
+            for idx, _ in to_send:
+                gen = results.get(str(idx))
+                if gen is not None and not isinstance(gen, Exception):
+                    cache.put(bodies[idx], gen)
+
+    written = 0
+    for idx, meta in items:
+        gen = results.get(str(idx))
+        if gen is None or isinstance(gen, Exception):
+            print(f"Error [{idx}/{total}] {meta['hanzi']}: {gen or 'sin resultado en el batch'}", file=sys.stderr)
+            continue
+        writer.writerow(build_row(meta, gen))
+        written += 1
+    print(f"Filas escritas: {written}/{len(items)}")
+    return 0
+
+
+def _run_batch_requests(api_key, model, items, poll_seconds, state_path, results, request_hashes):
+    """Submit (or resume) the batch for `items`, wait for it and add its results
+    to `results`. Returns 0 on success, 1 if the batch didn't complete.
+    request_hashes maps each custom_id to the body_hash of its request; it is
+    saved with the batch id, and a saved batch whose requests don't match
+    (other --input, --model or --max-items) is discarded."""
+    batch_id = None
+    if os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        batch_id = state.get("batch_id")
+        if batch_id and (state.get("model") != model or state.get("requests") != request_hashes):
+            print(f"Descartando batch {batch_id} de {state_path}: se creó con otro modelo o entrada "
+                  f"(modelo {state.get('model')}, {len(state.get('requests') or {})} peticiones)")
+            batch_id = None
+        elif batch_id:
+            print(f"Reanudando batch {batch_id} (de {state_path})")
+    if not batch_id:
+        batch_id = submit_batch(api_key, model, items)
+        with open(state_path, "w", encoding="utf-8") as f:
+            json.dump({"batch_id": batch_id, "model": model, "requests": request_hashes}, f)
+        print(f"Batch enviado: {batch_id} ({len(items)} peticiones)")
+    sys.stdout.flush()
+
+    batch = wait_for_batch(api_key, batch_id, poll_seconds)
+    if batch.get("status") != "completed":
+        # Start over with a new batch next time
+        os.remove(state_path)
+        print(f"Error: el batch {batch_id} terminó con estado {batch.get('status')}", file=sys.stderr)
+        return 1
+
+    results.update(fetch_batch_results(api_key, batch))
+    os.remove(state_path)
+    return 0
 
 
 def to_length_tag(hanzi):
@@ -160,6 +475,94 @@ def safe_join(arr):
     return " | ".join(x.strip() for x in arr if isinstance(x, str) and x.strip())
 
 
+def prepare_entry(e):
+    """Extract the fields sent to the model and the CSV tags from a dictionary entry.
+    Returns None if the entry has no hanzi."""
+    hanzi = fix_encoding(e.get("simplified", ""))
+    if not hanzi:
+        return None
+
+    forms = e.get("forms", [])
+    pinyin = ""
+    meanings = []
+    if forms:
+        pinyin = fix_encoding(forms[0].get("transcriptions", {}).get("pinyin", ""))
+        meanings = forms[0].get("meanings", [])
+
+    pos_list = e.get("pos", [])
+
+    freq_tags = []
+    hsk_tag = get_hsk_from_levels(e.get("level"))
+    if hsk_tag:
+        freq_tags.append(hsk_tag)
+    freq_bucket = get_freq_bucket(e.get("frequency", 0))
+    if freq_bucket:
+        freq_tags.append(freq_bucket)
+
+    return {
+        "hanzi": hanzi,
+        "pinyin": pinyin,
+        "pos": pos_list,
+        "meanings": meanings,
+        "pos_prefixed": [f"pos:{p}" for p in pos_list if p],
+        "freq_tags": freq_tags,
+    }
+
+
+def build_row(meta, gen):
+    """CSV row (in CSV_HEADER order) for a prepared entry and its generated content."""
+    tags_seed = gen.get("tags_seed", "")
+    tags_seed_str = ";".join(tags_seed) if isinstance(tags_seed, list) else str(tags_seed)
+
+    return [
+        meta["hanzi"],
+        meta["pinyin"],
+        gen.get("definition", "").strip(),
+        safe_join(gen.get("example_sentence", [])),
+        safe_join(gen.get("example_translation", [])),
+        gen.get("tips", "").strip(),
+        safe_join(gen.get("collocations", [])),
+        ";".join(meta["pos_prefixed"]),
+        gen.get("register", "reg:neutral"),
+        to_length_tag(meta["hanzi"]),
+        tags_seed_str,
+        ";".join(meta["freq_tags"]),
+    ]
+
+
+def map_in_order(executor, fn, items, window):
+    """
+    Like executor.map, but submits at most `window` items ahead of the one
+    being consumed, so an interrupted run doesn't leave a long queue of
+    requests still to be sent.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def entry_key(e):
+    """(hanzi, pinyin) identity of a dictionary entry, as prepare_entry reads them."""
+    forms = e.get("forms", [])
+    pinyin = fix_encoding(forms[0].get("transcriptions", {}).get("pinyin", "")) if forms else ""
+    return fix_encoding(e.get("simplified", "")), pinyin
+
+
+def load_done_keys(csv_path):
+    """(hanzi, pinyin) pairs already written to an output CSV (empty set if it doesn't exist yet).
+    Both are needed: heteronyms such as 行 (xíng / háng) get one row per reading."""
+    if not os.path.isfile(csv_path):
+        return set()
+    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        return {(row[0], row[1] if len(row) > 1 else "") for row in reader if row}
+
+
 def load_env_file(path):
     try:
         with open(path, "r", encoding="utf-8") as f:
@@ -177,14 +580,29 @@ def load_env_file(path):
         pass
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Genera CSV de vocabulario HSK enriquecido")
     parser.add_argument("--input", "-i", required=True, help="Ruta a complete.json o carpeta con chunks")
     parser.add_argument("--output", "-o", required=True, help="Ruta del CSV de salida")
     parser.add_argument("--model", default=DEFAULT_MODEL, help="Modelo OpenAI")
     parser.add_argument("--max-items", type=int, default=0, help="Procesar solo N items (0 = todos)")
-    parser.add_argument("--delay-ms", type=int, default=0, help="Retraso entre peticiones (ms)")
-    args = parser.parse_args()
+    parser.add_argument("--delay-ms", type=int, default=0, help="Retraso entre peticiones (ms), por hilo")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Peticiones simultáneas a la API (default: {DEFAULT_CONCURRENCY}, 1 = secuencial)")
+    parser.add_argument("--entries-per-request", type=int, default=DEFAULT_ENTRIES_PER_REQUEST,
+                        help="Palabras por petición en modo realtime; >1 reparte el prompt del sistema "
+                             f"entre varias (default: {DEFAULT_ENTRIES_PER_REQUEST})")
+    parser.add_argument("--mode", choices=["realtime", "batch"], default="realtime",
+                        help="realtime: una petición por entrada; batch: Batch API (50%% más barato, hasta 24h)")
+    parser.add_argument("--poll-seconds", type=int, default=BATCH_POLL_SECONDS,
+                        help=f"Intervalo de consulta del estado del batch (default: {BATCH_POLL_SECONDS})")
+    parser.add_argument("--cache-file", default=RESPONSE_CACHE,
+                        help=f"Caché de respuestas de la API (default: {RESPONSE_CACHE})")
+    parser.add_argument("--skip-cache", action="store_true",
+                        help="No leer ni guardar respuestas en la caché")
+    parser.add_argument("--resume", action="store_true",
+                        help="Añadir al CSV de salida existente, saltando las palabras que ya contiene")
+    args = parser.parse_args(argv)
 
     script_dir = Path(__file__).resolve().parent
     for candidate in [Path.cwd() / ".env", script_dir / ".env", script_dir.parent / ".env"]:
@@ -199,86 +617,159 @@ def main():
 
     start_time = time.time()
     total_tokens = 0
-    entries = read_entries(args.input)
-    if args.max_items > 0:
-        entries = entries[: args.max_items]
-
-    print(f"Starting processing of {len(entries)} entries...")
+    # Count entries first (streaming pass) so progress/ETA work without
+    # keeping every entry in memory
+    limit = args.max_items if args.max_items > 0 else None
+    done = load_done_keys(args.output) if args.resume else set()
+    if done:
+        print(f"Reanudando: {len(done)} palabras ya en {args.output}")
+
+    def pending_entries():
+        entries = itertools.islice(iter_entries(args.input), limit)
+        if not done:
+            return entries
+        return (e for e in entries if entry_key(e) not in done)
+
+    total = sum(1 for _ in pending_entries())
+    entries = pending_entries()
+
+    cache = None if args.skip_cache else ResponseCache(args.cache_file)
+    concurrency = max(1, args.concurrency)
+    how = "Batch API" if args.mode == "batch" else f"{concurrency} concurrent requests"
+    print(f"Starting processing of {total} entries ({how})...")
     sys.stdout.flush()
 
-    with open(args.output, "w", encoding="utf-8", newline="") as f_csv:
+    append = args.resume and os.path.isfile(args.output) and os.path.getsize(args.output) > 0
+    with open(args.output, "a" if append else "w", encoding="utf-8", newline="") as f_csv:
         writer = csv.writer(f_csv)
-        writer.writerow(CSV_HEADER)
-        f_csv.flush()
-
-        for idx, e in enumerate(entries, 1):
-            hanzi = fix_encoding(e.get("simplified", ""))
-            if not hanzi:
-                continue
-
-            forms = e.get("forms", [])
-            pinyin = ""
-            if forms:
-                pinyin = fix_encoding(forms[0].get("transcriptions", {}).get("pinyin", ""))
-
-            pos_list = e.get("pos", [])
-            pos_prefixed = [f"pos:{p}" for p in pos_list if p]
-
-            meanings = []
-            if forms:
-                meanings = forms[0].get("meanings", [])
-
-            hsk_tag = get_hsk_from_levels(e.get("level"))
-            freq_bucket = get_freq_bucket(e.get("frequency", 0))
-            freq_tags = []
-            if hsk_tag:
-                freq_tags.append(hsk_tag)
-            if freq_bucket:
-                freq_tags.append(freq_bucket)
-            length_tag = to_length_tag(hanzi)
-
-            try:
-                gen = openai_generate(api_key, args.model, hanzi, pinyin, pos_list, meanings)
-                # Estimate tokens: ~150 input + ~400 output per call
-                total_tokens += 550
-            except Exception as ex:
-                print(f"Error [{idx}/{len(entries)}] {hanzi}: {ex}", file=sys.stderr)
-                sys.stderr.flush()
-                continue
-
-            tags_seed = gen.get("tags_seed", "")
-            tags_seed_str = ";".join(tags_seed) if isinstance(tags_seed, list) else str(tags_seed)
-
-            row = [
-                hanzi,
-                pinyin,
-                gen.get("definition", "").strip(),
-                safe_join(gen.get("example_sentence", [])),
-                safe_join(gen.get("example_translation", [])),
-                gen.get("tips", "").strip(),
-                safe_join(gen.get("collocations", [])),
-                ";".join(pos_prefixed),
-                gen.get("register", "reg:neutral"),
-                length_tag,
-                tags_seed_str,
-                ";".join(freq_tags),
-            ]
-            writer.writerow(row)
+        if not append:
+            writer.writerow(CSV_HEADER)
             f_csv.flush()
 
-            if idx % 5 == 0 or idx == 1:
-                elapsed = time.time() - start_time
-                rate = idx / elapsed if elapsed > 0 else 0
-                remaining = (len(entries) - idx) / rate if rate > 0 else 0
-                # Cost estimate: $0.150/1M input + $0.600/1M output for gpt-4o-mini
-                # Approx 150 input + 400 output tokens per call = 550 total
-                cost = (total_tokens * 0.15 / 1_000_000) + (total_tokens * 0.4 / 1_000_000)
-                print(f"Progress: {idx}/{len(entries)} ({idx*100//len(entries)}%) | Rate: {rate:.1f}/min | ETA: {remaining/60:.1f}min | Tokens: {total_tokens:,} | Cost: ${cost:.3f}")
-                sys.stdout.flush()
-
+        items = ((idx, meta) for idx, meta in enumerate(map(prepare_entry, entries), 1) if meta)
+
+        # The source can list the same word more than once (several chunks,
+        # old and new HSK lists): generate each (hanzi, pinyin) only once
+        seen = set()
+        duplicates = 0
+
+        def first_occurrence(item):
+            nonlocal duplicates
+            key = (item[1]["hanzi"], item[1]["pinyin"])
+            if key in seen:
+                duplicates += 1
+                return False
+            seen.add(key)
+            return True
+
+        items = filter(first_occurrence, items)
+
+        if args.mode == "batch":
+            status = run_batch(api_key, args.model, items, writer, total,
+                               args.poll_seconds, args.output + ".batch.json", cache)
+            if duplicates:
+                print(f"Duplicados omitidos: {duplicates}")
+            if status == 0:
+                print(f"CSV generado: {args.output}")
+            return status
+
+        def delay():
             if args.delay_ms > 0:
                 time.sleep(args.delay_ms / 1000.0)
 
+        def run_group(group):
+            """Generate a group of (idx, meta) items: cached ones are looked up,
+            the rest are asked for in one request (falling back to one request
+            per entry if the grouped answer doesn't fit). Returns one
+            (idx, meta, gen, cached, error) tuple per item, in order."""
+            results = {}
+            bodies = {}
+            for idx, meta in group:
+                body = bodies[idx] = build_request_body(args.model, meta["hanzi"], meta["pinyin"], meta["pos"], meta["meanings"])
+                gen = cache.get(body) if cache is not None else None
+                if gen is not None:
+                    results[idx] = (gen, True, None)
+            missing = [(idx, meta) for idx, meta in group if idx not in results]
+
+            if len(missing) > 1:
+                try:
+                    gens = request_group_completion(api_key, args.model, [meta for _, meta in missing])
+                except ValueError:
+                    pass  # malformed grouped answer: ask for each entry below
+                except Exception as ex:
+                    for idx, _ in missing:
+                        results[idx] = (None, False, ex)
+                else:
+                    for (idx, _), gen in zip(missing, gens):
+                        results[idx] = (gen, False, None)
+                finally:
+                    delay()
+
+            for idx, meta in missing:
+                if idx in results:
+                    continue
+                try:
+                    results[idx] = (request_completion(api_key, bodies[idx]), False, None)
+                except Exception as ex:
+                    results[idx] = (None, False, ex)
+                finally:
+                    delay()
+
+            # Cached under each entry's own request body, so single and grouped runs share it
+            if cache is not None:
+                for idx, _ in missing:
+                    gen, _, ex = results[idx]
+                    if ex is None:
+                        cache.put(bodies[idx], gen)
+            return [(idx, meta) + results[idx] for idx, meta in group]
+
+        # Entries are independent and each call is dominated by network latency,
+        # so keep several requests in flight. Results come back in input order,
+        # so the CSV has the same row order as a sequential run.
+        pending_rows = []
+        cache_hits = 0
+        per_request = max(1, args.entries_per_request)
+        groups = iter(lambda: list(itertools.islice(items, per_request)), [])
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = map_in_order(executor, run_group, groups, window=concurrency * 2)
+                for idx, meta, gen, cached, ex in itertools.chain.from_iterable(results):
+                    hanzi = meta["hanzi"]
+                    if ex is not None:
+                        print(f"Error [{idx}/{total}] {hanzi}: {ex}", file=sys.stderr)
+                        sys.stderr.flush()
+                        continue
+                    if cached:
+                        cache_hits += 1
+                    else:
+                        # Estimate tokens: ~150 input + ~400 output per call
+                        total_tokens += 550
+
+                    # Rows are written and flushed FLUSH_EVERY at a time, which
+                    # bounds what a killed run can lose without a syscall per row
+                    pending_rows.append(build_row(meta, gen))
+                    if len(pending_rows) >= FLUSH_EVERY:
+                        writer.writerows(pending_rows)
+                        pending_rows.clear()
+                        f_csv.flush()
+
+                    if idx % 5 == 0 or idx == 1:
+                        elapsed = time.time() - start_time
+                        rate = idx / elapsed if elapsed > 0 else 0
+                        remaining = (total - idx) / rate if rate > 0 else 0
+                        # Cost estimate: $0.150/1M input + $0.600/1M output for gpt-4o-mini
+                        # Approx 150 input + 400 output tokens per call = 550 total
+                        cost = (total_tokens * 0.15 / 1_000_000) + (total_tokens * 0.4 / 1_000_000)
+                        print(f"Progress: {idx}/{total} ({idx*100//total}%) | Rate: {rate:.1f}/min | ETA: {remaining/60:.1f}min | Tokens: {total_tokens:,} | Cost: ${cost:.3f}")
+                        sys.stdout.flush()
+        finally:
+            # Also on errors and Ctrl+C, so finished rows are never lost
+            writer.writerows(pending_rows)
+
+    if cache_hits:
+        print(f"Respuestas en caché: {cache_hits}")
+    if duplicates:
+        print(f"Duplicados omitidos: {duplicates}")
     print(f"CSV generado: {args.output}")
     return 0
 
@@ -1,28 +1,46 @@
-# dump_notes.py
+# dump_deck.py
 # Exporta todas las notas de un mazo de Anki a un JSON (vía AnkiConnect).
 # Uso:
-#   python dump_notes.py "Nombre del Mazo"
+#   python dump_deck.py "Nombre del Mazo" [--output salida.json]
+#   python dump_deck.py --deck "Nombre del Mazo" [--output salida.json]
 #
 # Salida:
-#   anki_dump_<nombre_sanitizado>.json (con noteId, modelName, fields, tags)
+#   outputs/anki_dump_<nombre_sanitizado>.json (con noteId, modelName, fields, tags)
 
+import argparse
 import sys
 import json
 import re
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # opcional: JSON más rápido para mazos grandes
+    orjson = None
+
 # Cargar variables de entorno
 load_dotenv()
 
 # Configuración de AnkiConnect desde .env o default
 ANKI = os.getenv("ANKI_CONNECT_URL", "http://localhost:8765")
 
+# Sesión compartida solo para reintentar conexiones fallidas. No ahorra
+# handshakes: AnkiConnect cierra el socket tras cada respuesta.
+_SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=50, pool_maxsize=50,
+                       max_retries=Retry(total=3, backoff_factor=0.5))
+_SESSION.mount("http://", _adapter)
+_SESSION.mount("https://", _adapter)
+
 def call(action, **params):
-    resp = requests.post(ANKI, json={"action": action, "version": 6, "params": params})
+    resp = _SESSION.post(ANKI, json={"action": action, "version": 6, "params": params})
     resp.raise_for_status()
-    data = resp.json()
+    data = orjson.loads(resp.content) if orjson is not None else resp.json()
     if data.get("error"):
         raise RuntimeError(data["error"])
     return data["result"]
@@ -31,17 +49,29 @@ def sanitize_filename(name: str) -> str:
     # Reemplaza caracteres problemáticos para nombres de archivo en Windows
     return re.sub(r'[^-\w\.]+', '_', name, flags=re.UNICODE)
 
-def main():
-    if len(sys.argv) < 2:
-        print("Uso: python dump_notes.py \"Nombre del Mazo\"")
-        sys.exit(1)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta las notas de un mazo de Anki a JSON")
+    parser.add_argument("deck_name", nargs="?", help="Nombre del mazo")
+    parser.add_argument("--deck", help="Nombre del mazo (alternativa al argumento posicional)")
+    parser.add_argument("--output", help="Ruta del JSON de salida")
+    args = parser.parse_args(argv)
+
+    deck_name = args.deck or args.deck_name
+    if not deck_name:
+        print("Uso: python dump_deck.py \"Nombre del Mazo\"")
+        return 1
 
-    deck_name = sys.argv[1]
-    out_name = f"anki_dump_{sanitize_filename(deck_name)}.json"
-    root_dir = os.path.dirname(os.path.dirname(__file__))
-    outputs_dir = os.path.join(root_dir, "outputs")
-    os.makedirs(outputs_dir, exist_ok=True)
-    out_path = os.path.join(outputs_dir, out_name)
+    if args.output:
+        out_path = args.output
+        out_dir = os.path.dirname(out_path)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+    else:
+        out_name = f"anki_dump_{sanitize_filename(deck_name)}.json"
+        root_dir = os.path.dirname(os.path.dirname(__file__))
+        outputs_dir = os.path.join(root_dir, "outputs")
+        os.makedirs(outputs_dir, exist_ok=True)
+        out_path = os.path.join(outputs_dir, out_name)
 
     # 0) Comprobación básica de conexión
     try:
@@ -50,7 +80,7 @@ def main():
         print("❌ No se pudo contactar AnkiConnect. "
               "Asegúrate de que Anki está abierto y AnkiConnect instalado.")
         print("Detalle:", e)
-        sys.exit(1)
+        return 1
 
     # 1) Buscar notas del mazo
     query = f'deck:"{deck_name}"'
@@ -60,15 +90,18 @@ def main():
 
     if not note_ids:
         print("⚠️ No se encontraron notas. Revisa el nombre exacto del mazo.")
-        sys.exit(0)
+        return 0
 
     # 2) Obtener información detallada por tandas
+    #    (se piden todas las tandas a la vez y se leen en orden)
     chunk = 1000
     info = []
-    for i in range(0, len(note_ids), chunk):
-        part = note_ids[i:i+chunk]
-        info.extend(call("notesInfo", notes=part))
-        print(f"… procesadas {min(i+chunk, len(note_ids))}/{len(note_ids)}")
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        futures = [(i, ex.submit(call, "notesInfo", notes=note_ids[i:i+chunk]))
+                   for i in range(0, len(note_ids), chunk)]
+        for i, future in futures:
+            info.extend(future.result())
+            print(f"… procesadas {min(i+chunk, len(note_ids))}/{len(note_ids)}")
 
     # 3) Construir salida compacta y útil
     export = []
@@ -81,10 +114,15 @@ def main():
         })
 
     # 4) Guardar JSON
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(export, f, ensure_ascii=False, indent=2)
+    if orjson is not None:
+        with open(out_path, "wb") as f:
+            f.write(orjson.dumps(export, option=orjson.OPT_INDENT_2))
+    else:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(export, f, ensure_ascii=False, indent=2)
 
     print(f"✅ Exportadas {len(export)} notas a: {out_path}")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
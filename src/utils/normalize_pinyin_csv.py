@@ -11,13 +11,13 @@ Converts various pinyin formats to standard format with diacritics:
 import argparse
 import csv
 import sys
-import codecs
 import re
+from functools import lru_cache
 from pathlib import Path
 
 # Configure UTF-8 for Windows
-if sys.platform == "win32":
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
+if sys.platform == "win32" and hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
 
 
 # Tone mark conversion tables
@@ -31,7 +31,18 @@ TONE_MARKS = {
     'v': ['ǖ', 'ǘ', 'ǚ', 'ǜ', 'ü'],  # v is sometimes used for ü
 }
 
+MAX_CHANGES_SHOWN = 20
 
+# Precompiled patterns (used once or more per syllable)
+_DIGIT_RE = re.compile(r'\d')
+_COLON_RE = re.compile(r':(\d)')
+_SYL_TONE_RE = re.compile(r'^([a-züvāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ]+?)(\d)$', re.IGNORECASE)
+_HAS_DIAC_RE = re.compile(r'[āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ]')
+# One or more letters (including ü, v, :, and pinyin diacritics) followed by a digit
+_SYL_PATTERN_RE = re.compile(r'[a-züvāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ:]+\d', re.IGNORECASE)
+
+
+@lru_cache(maxsize=4096)
 def add_tone_mark(syllable: str, tone: int) -> str:
     """Add tone mark to a pinyin syllable.
     
@@ -104,6 +115,7 @@ def add_tone_mark(syllable: str, tone: int) -> str:
     return syllable
 
 
+@lru_cache(maxsize=8192)
 def normalize_pinyin_syllable(syllable: str) -> str:
     """Normalize a single pinyin syllable to standard format.
     
@@ -129,18 +141,18 @@ def normalize_pinyin_syllable(syllable: str) -> str:
     syllable = syllable.strip()
     
     # Check for colon format: lu:3 -> lu3
-    syllable = re.sub(r':(\d)', r'\1', syllable)
+    syllable = _COLON_RE.sub(r'\1', syllable)
     
     # Check if it has a tone number at the end
     # Pattern: any characters (including diacritics) followed by a digit
-    match = re.match(r'^([a-züvāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ]+?)(\d)$', syllable, re.IGNORECASE)
+    match = _SYL_TONE_RE.match(syllable)
     
     if match:
         base, tone_str = match.groups()
         tone = int(tone_str)
         
         # Check if base already has diacritics (tone marks)
-        has_diacritics = bool(re.search(r'[āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ]', base))
+        has_diacritics = bool(_HAS_DIAC_RE.search(base))
         
         if has_diacritics:
             # Already has tone marks, just remove the number
@@ -189,6 +201,11 @@ def normalize_pinyin_format(pinyin: str) -> str:
     if not pinyin or not isinstance(pinyin, str):
         return pinyin
     
+    # No tone numbers (e.g. already normalized): nothing to convert, only the
+    # spacing of space-separated syllables is tidied as below
+    if not _DIGIT_RE.search(pinyin):
+        return ' '.join(pinyin.split()) if ' ' in pinyin else pinyin
+    
     # First, check if it's space-separated (most common case)
     if ' ' in pinyin:
         syllables = pinyin.split()
@@ -199,8 +216,7 @@ def normalize_pinyin_format(pinyin: str) -> str:
     # Strategy: find all letter+number patterns
     # Pattern: one or more letters (including ü, v, :, and pinyin diacritics) followed by digit
     # Include common pinyin vowels with tone marks: āáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ
-    syllable_pattern = r'[a-züvāáǎàēéěèīíǐìōóǒòūúǔùǖǘǚǜ:]+\d'
-    matches = re.findall(syllable_pattern, pinyin, flags=re.IGNORECASE)
+    matches = _SYL_PATTERN_RE.findall(pinyin)
     
     if matches:
         # Check if there are leftover letters (e.g., "meifa" in "meifar5")
@@ -240,34 +256,43 @@ def normalize_csv_pinyin(input_csv: str, output_csv: str, dry_run: bool = False)
     rows_processed = 0
     rows_changed = 0
     
-    # Read and process CSV
-    with open(input_path, 'r', encoding='utf-8') as f_in:
-        reader = csv.DictReader(f_in)
-        fieldnames = reader.fieldnames
+    # Read and process CSV (plain lists instead of a dict per row)
+    with open(input_path, 'r', encoding='utf-8', newline='') as f_in:
+        reader = csv.reader(f_in)
+        fieldnames = next(reader, None) or []
         
         if 'pinyin' not in fieldnames:
             print(f"❌ Error: CSV does not have 'pinyin' column")
             print(f"   Available columns: {', '.join(fieldnames)}")
             return False
         
+        pinyin_idx = fieldnames.index('pinyin')
+        hanzi_idx = fieldnames.index('hanzi') if 'hanzi' in fieldnames else None
+        n_fields = len(fieldnames)
+        
         rows = []
-        for row_num, row in enumerate(reader, start=2):
+        # Blank lines are skipped, as DictReader does
+        for row_num, row in enumerate((r for r in reader if r), start=2):
             rows_processed += 1
-            original_pinyin = row.get('pinyin', '')
+            if len(row) < n_fields:
+                row.extend([''] * (n_fields - len(row)))
+            original_pinyin = row[pinyin_idx]
             
             if original_pinyin:
                 normalized_pinyin = normalize_pinyin_format(original_pinyin)
                 
                 if normalized_pinyin != original_pinyin:
                     rows_changed += 1
-                    hanzi = row.get('hanzi', '?')
-                    changes.append({
-                        'row': row_num,
-                        'hanzi': hanzi,
-                        'original': original_pinyin,
-                        'normalized': normalized_pinyin
-                    })
-                    row['pinyin'] = normalized_pinyin
+                    # Only the first few changes are shown
+                    if len(changes) < MAX_CHANGES_SHOWN:
+                        hanzi = row[hanzi_idx] if hanzi_idx is not None else '?'
+                        changes.append({
+                            'row': row_num,
+                            'hanzi': hanzi,
+                            'original': original_pinyin,
+                            'normalized': normalized_pinyin
+                        })
+                    row[pinyin_idx] = normalized_pinyin
             
             rows.append(row)
     
@@ -283,20 +308,20 @@ def normalize_csv_pinyin(input_csv: str, output_csv: str, dry_run: bool = False)
     if changes:
         print(f"\nCHANGES DETECTED:")
         print(f"{'-' * 80}")
-        for change in changes[:20]:  # Show first 20
+        for change in changes:
             print(f"  Row {change['row']} ({change['hanzi']})")
             print(f"    Before: {change['original']}")
             print(f"    After:  {change['normalized']}")
         
-        if len(changes) > 20:
-            print(f"  ... and {len(changes) - 20} more changes")
+        if rows_changed > len(changes):
+            print(f"  ... and {rows_changed - len(changes)} more changes")
     
     # Write output
     if not dry_run:
         output_path = Path(output_csv)
         with open(output_path, 'w', encoding='utf-8', newline='') as f_out:
-            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-            writer.writeheader()
+            writer = csv.writer(f_out)
+            writer.writerow(fieldnames)
             writer.writerows(rows)
         
         print(f"\n✅ Normalized CSV written to: {output_csv}")
@@ -5,58 +5,89 @@ Validate audio files: check that all required audio files exist for CSV entries.
 import argparse
 import csv
 import sys
-import codecs
 import os
 import hashlib
 import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+# One missing file: CSV row number, hanzi, audio type and expected path
+MissingAudio = namedtuple("MissingAudio", ["row", "hanzi", "type", "path"])
+
+# Rows per task when the filenames are computed in several processes
+CHUNK_ROWS = 2000
+
+_PINYIN_PARENS_RE = re.compile(r'\s*\([^)]*\)\s*')
+_FILENAME_BAD_RE = re.compile(r'[<>:"/\\|?*]')
+_WHITESPACE_RE = re.compile(r'\s+')
 
 # Configure UTF-8 for Windows
-if sys.platform == "win32":
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
+if sys.platform == "win32" and hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
 
 
+@lru_cache(maxsize=8192)
 def clean_pinyin_from_sentence(sentence: str) -> str:
-    """Remove pinyin in parentheses from Chinese sentences."""
+    """Remove pinyin in parentheses from Chinese sentences.
+    Cached: the same sentences recur across rows."""
     if not sentence:
         return ""
-    result = re.sub(r'\s*\([^)]*\)\s*', '', sentence)
+    result = _PINYIN_PARENS_RE.sub('', sentence)
     return result.strip()
 
 
+@lru_cache(maxsize=32768)
 def sanitize_filename(text: str) -> str:
-    """Sanitize text for use in filename (same as generate_audio.py)."""
+    """Sanitize text for use in filename (same as generate_audio.py).
+    Cached: called for every word and sentence, so it sees about twice as many keys."""
     # Remove or replace problematic characters
-    text = re.sub(r'[<>:"/\\|?*]', '', text)
-    text = re.sub(r'\s+', '_', text)
+    text = _FILENAME_BAD_RE.sub('', text)
+    text = _WHITESPACE_RE.sub('_', text)
     return text[:50]  # Limit length
 
 
+@lru_cache(maxsize=8192)
 def calculate_hash(text: str) -> str:
-    """Calculate MD5 hash for audio filename (first 8 characters)."""
+    """Calculate MD5 hash for audio filename (first 8 characters).
+    Cached: the same sentences recur across rows."""
     return hashlib.md5(text.encode('utf-8')).hexdigest()[:8]
 
 
-def get_expected_audio_files(row: Dict[str, str], audio_dir: str) -> List[Tuple[str, str, bool]]:
+def list_existing_audio(audio_dir: str) -> set:
+    """Names of the entries in audio_dir (one directory scan instead of a stat per file)."""
+    with os.scandir(audio_dir) as entries:
+        return {entry.name for entry in entries}
+
+
+def get_expected_audio_files(row: Dict[str, str], audio_dir: str,
+                             existing: Optional[set] = None) -> List[Tuple[str, str, bool]]:
     """Get list of expected audio files for a CSV row.
     
+    existing: names already in audio_dir (see list_existing_audio);
+        if None, each file is checked on disk
+    
     Returns:
         List of tuples: (audio_type, expected_path, exists)
     """
-    hanzi = row.get("hanzi", "").strip()
-    sentences_raw = row.get("example_sentence", "").strip()
+    return expected_audio_files(row.get("hanzi", ""), row.get("example_sentence", ""), audio_dir, existing)
+
+
+def expected_audio_names(hanzi: str, sentences_raw: str) -> List[Tuple[str, str]]:
+    """Expected (audio_type, filename) pairs for the hanzi and example_sentence values of a row."""
+    hanzi = hanzi.strip()
+    sentences_raw = sentences_raw.strip()
     
-    expected_files = []
+    expected_names = []
     
     # Word audio
     if hanzi:
         word_hash = calculate_hash(hanzi)
         # Use sanitize_filename to match generate_audio.py
-        word_filename = f"word_{sanitize_filename(hanzi)}_{word_hash}.mp3"
-        word_path = os.path.join(audio_dir, word_filename)
-        exists = os.path.exists(word_path)
-        expected_files.append(("word", word_path, exists))
+        expected_names.append(("word", f"word_{sanitize_filename(hanzi)}_{word_hash}.mp3"))
     
     # Sentence audios
     if sentences_raw:
@@ -68,16 +99,57 @@ def get_expected_audio_files(row: Dict[str, str], audio_dir: str) -> List[Tuple[
                 sentence_hash = calculate_hash(clean_sentence)
                 # Use first 30 chars and sanitize to match generate_audio.py
                 sentence_filename = f"{sanitize_filename(clean_sentence[:30])}_{sentence_hash}.mp3"
-                sentence_path = os.path.join(audio_dir, sentence_filename)
-                exists = os.path.exists(sentence_path)
-                expected_files.append((f"sentence[{i}]", sentence_path, exists))
+                expected_names.append((f"sentence[{i}]", sentence_filename))
     
+    return expected_names
+
+
+def expected_audio_files(hanzi: str, sentences_raw: str, audio_dir: str,
+                         existing: Optional[set] = None) -> List[Tuple[str, str, bool]]:
+    """get_expected_audio_files for the hanzi and example_sentence values of a row."""
+    dir_prefix = os.path.join(audio_dir, "")  # audio_dir with a trailing separator
+    expected_files = []
+    for audio_type, filename in expected_audio_names(hanzi, sentences_raw):
+        path = dir_prefix + filename
+        exists = filename in existing if existing is not None else os.path.exists(path)
+        expected_files.append((audio_type, path, exists))
     return expected_files
 
 
-def validate_audio(csv_path: str, audio_dir: str) -> Tuple[int, int, List[Dict]]:
+def _column(row: List[str], idx: Optional[int]) -> str:
+    """Value of column idx in a csv.reader row ("" if absent)."""
+    return row[idx] if idx is not None and idx < len(row) else ""
+
+
+def _chunk_names(chunk: List[Tuple[int, str, str]]) -> List[Tuple[int, str, List[Tuple[str, str]]]]:
+    """expected_audio_names for a chunk of (row_num, hanzi, sentences_raw) rows (runs in a worker process)."""
+    return [(row_num, hanzi, expected_audio_names(hanzi, sentences_raw))
+            for row_num, hanzi, sentences_raw in chunk]
+
+
+def _iter_expected_names(rows, workers: int):
+    """
+    Yield (row_num, hanzi, expected_names) for each row, in order.
+    With workers > 1, rows are sent to worker processes in chunks of CHUNK_ROWS.
+    """
+    if workers <= 1:
+        for row_num, hanzi, sentences_raw in rows:
+            yield row_num, hanzi, expected_audio_names(hanzi, sentences_raw)
+        return
+    chunks = iter(lambda: list(islice(rows, CHUNK_ROWS)), [])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from chain.from_iterable(executor.map(_chunk_names, chunks))
+
+
+def validate_audio(csv_path: str, audio_dir: str, collect_details: bool = True,
+                   workers: int = 1) -> Tuple[int, int, List[MissingAudio]]:
     """Validate audio files for all CSV entries.
     
+    If collect_details is False, missing files are only counted and
+    missing_details is returned empty.
+    workers > 1 computes the expected filenames in that many processes
+    (only worth it for very large CSVs); results are the same.
+    
     Returns:
         Tuple of (total_files_expected, missing_files, missing_details)
     """
@@ -85,29 +157,37 @@ def validate_audio(csv_path: str, audio_dir: str) -> Tuple[int, int, List[Dict]]
     missing_count = 0
     missing_details = []
     
-    # Track unique audio files to avoid counting duplicates
+    # Track unique audio files to avoid counting duplicates (by filename:
+    # they all live in audio_dir, so the full path is only built when reported)
     seen_files = set()
+    existing = list_existing_audio(audio_dir)
+    dir_prefix = os.path.join(audio_dir, "")  # audio_dir with a trailing separator
     
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        # Plain rows with the two column indexes looked up once (no dict per row)
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        hanzi_idx = header.index("hanzi") if "hanzi" in header else None
+        sentence_idx = header.index("example_sentence") if "example_sentence" in header else None
         
-        for row_num, row in enumerate(reader, start=2):
-            hanzi = row.get("hanzi", "").strip()
-            expected_files = get_expected_audio_files(row, audio_dir)
-            
-            for audio_type, audio_path, exists in expected_files:
+        # Blank lines are skipped, as DictReader does
+        rows = ((row_num, _column(row, hanzi_idx).strip(), _column(row, sentence_idx))
+                for row_num, row in enumerate((r for r in reader if r), start=2))
+        
+        # Rows come back in CSV order, so deduplication (and the row reported
+        # for each missing file) is the same as in a sequential run
+        for row_num, hanzi, expected_names in _iter_expected_names(rows, workers):
+            for audio_type, filename in expected_names:
                 # Only count unique files (same sentence may appear in multiple entries)
-                if audio_path not in seen_files:
-                    seen_files.add(audio_path)
-                    total_expected += 1
-                    if not exists:
-                        missing_count += 1
-                        missing_details.append({
-                            "row": row_num,
-                            "hanzi": hanzi,
-                            "type": audio_type,
-                            "path": audio_path
-                        })
+                if filename in seen_files:
+                    continue
+                seen_files.add(filename)
+                total_expected += 1
+                if filename not in existing:
+                    missing_count += 1
+                    if collect_details:
+                        audio_path = dir_prefix + filename
+                        missing_details.append(MissingAudio(row_num, hanzi, audio_type, audio_path))
     
     return total_expected, missing_count, missing_details
 
@@ -135,6 +215,12 @@ def main():
         metavar="OUTPUT_FILE",
         help="Export list of missing files to text file"
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes used to compute expected filenames (default: 1; only helps on very large CSVs)"
+    )
     
     args = parser.parse_args()
     
@@ -153,7 +239,9 @@ def main():
     
     # Run validation
     total_expected, missing_count, missing_details = validate_audio(
-        args.csv_file, args.audio_dir
+        args.csv_file, args.audio_dir,
+        collect_details=bool(args.show_missing or args.export_missing),
+        workers=args.workers
     )
     
     # Print results
@@ -174,16 +262,17 @@ def main():
             print("MISSING AUDIO FILES:")
             print("-" * 80)
             for detail in missing_details:
-                print(f"  Row {detail['row']} ({detail['hanzi']}) - {detail['type']}")
-                print(f"    Expected: {detail['path']}")
+                print(f"  Row {detail.row} ({detail.hanzi}) - {detail.type}")
+                print(f"    Expected: {detail.path}")
         
         if args.export_missing:
             with open(args.export_missing, 'w', encoding='utf-8') as f:
-                f.write("Missing Audio Files Report\n")
-                f.write("=" * 80 + "\n\n")
-                for detail in missing_details:
-                    f.write(f"Row {detail['row']} ({detail['hanzi']}) - {detail['type']}\n")
-                    f.write(f"  Expected: {detail['path']}\n\n")
+                f.write("Missing Audio Files Report\n" + "=" * 80 + "\n\n")
+                # One formatted string per file, written with a single writelines call
+                f.writelines(
+                    f"Row {detail.row} ({detail.hanzi}) - {detail.type}\n  Expected: {detail.path}\n\n"
+                    for detail in missing_details
+                )
             print()
             print(f"✅ OK: Missing files list exported to: {args.export_missing}")
     else:
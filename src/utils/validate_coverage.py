@@ -6,36 +6,53 @@ import argparse
 import csv
 import json
 import sys
-import codecs
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # optional: faster JSON for large vocabulary files
+    orjson = None
+
 # Configure UTF-8 for Windows
-if sys.platform == "win32":
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
+if sys.platform == "win32" and hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
 
 
-def load_json_entries(json_path: str) -> set:
-    """Load hanzi entries from JSON file."""
+def _load_json(json_path: str):
+    """Parse a JSON file, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(Path(json_path).read_bytes())
     with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Extract hanzi from each entry (try both 'hanzi' and 'simplified' keys)
-    hanzi_set = set()
-    for entry in data:
-        hanzi = entry.get('hanzi', entry.get('simplified', '')).strip()
-        if hanzi:
-            hanzi_set.add(hanzi)
-    
-    return hanzi_set
+        return json.load(f)
+
+
+def entry_hanzi(entry: dict) -> str:
+    """Hanzi of a JSON entry (try both 'hanzi' and 'simplified' keys)."""
+    return entry.get('hanzi', entry.get('simplified', '')).strip()
+
+
+def load_json_entries(json_path: str) -> tuple:
+    """
+    Load hanzi entries from JSON file.
+    Returns (hanzi_set, full_data), so the data can be reused without parsing the file again.
+    """
+    data = _load_json(json_path)
+    hanzi_set = set(map(entry_hanzi, data))
+    hanzi_set.discard('')
+    return hanzi_set, data
 
 
 def load_csv_entries(csv_path: str) -> set:
     """Load hanzi entries from CSV file."""
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
         hanzi_set = set()
+        if 'hanzi' not in header:
+            return hanzi_set
+        idx = header.index('hanzi')
         for row in reader:
-            hanzi = row.get('hanzi', '').strip()
+            hanzi = row[idx].strip() if idx < len(row) else ''
             if hanzi:
                 hanzi_set.add(hanzi)
     
@@ -44,14 +61,16 @@ def load_csv_entries(csv_path: str) -> set:
 
 def load_full_json_data(json_path: str) -> list:
     """Load full JSON data."""
-    with open(json_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return _load_json(json_path)
 
 
 def validate_coverage(json_path: str, csv_path: str):
-    """Validate which JSON entries are missing from CSV."""
+    """
+    Validate which JSON entries are missing from CSV.
+    Returns (missing_hanzi, json_data).
+    """
     print(f"Loading JSON entries from: {json_path}")
-    json_entries = load_json_entries(json_path)
+    json_entries, json_data = load_json_entries(json_path)
     print(f"  Found {len(json_entries)} entries in JSON")
     
     print(f"\nLoading CSV entries from: {csv_path}")
@@ -78,24 +97,21 @@ def validate_coverage(json_path: str, csv_path: str):
     else:
         print("\n✅ All JSON entries were successfully generated in CSV!")
     
-    return missing
+    return missing, json_data
 
 
-def export_missing_entries(json_path: str, missing_hanzi: set, output_path: str):
-    """Export missing entries to a new JSON file."""
-    # Load full JSON data
-    full_data = load_full_json_data(json_path)
-    
+def export_missing_entries(full_data: list, missing_hanzi: set, output_path: str):
+    """Export missing entries (from the already loaded JSON data) to a new JSON file."""
     # Filter entries that are missing
-    missing_entries = []
-    for entry in full_data:
-        hanzi = entry.get('hanzi', entry.get('simplified', '')).strip()
-        if hanzi in missing_hanzi:
-            missing_entries.append(entry)
+    missing_entries = [entry for entry in full_data if entry_hanzi(entry) in missing_hanzi]
     
     # Write to output file
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(missing_entries, f, ensure_ascii=False, indent=2)
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(missing_entries, option=orjson.OPT_INDENT_2))
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(missing_entries, f, ensure_ascii=False, indent=2)
     
     print(f"\n✅ Exported {len(missing_entries)} missing entries to: {output_path}")
 
@@ -135,7 +151,7 @@ def main():
         sys.exit(1)
     
     # Run validation
-    missing = validate_coverage(args.json_file, args.csv_file)
+    missing, json_data = validate_coverage(args.json_file, args.csv_file)
     
     # Show missing entries if requested
     if args.show_missing and missing:
@@ -146,7 +162,7 @@ def main():
     
     # Export missing entries if requested
     if args.export_missing and missing:
-        export_missing_entries(args.json_file, missing, args.export_missing)
+        export_missing_entries(json_data, missing, args.export_missing)
     
     # Always exit with success - finding missing entries is expected behavior
     sys.exit(0)
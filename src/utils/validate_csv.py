@@ -5,19 +5,30 @@ Validate CSV quality: check for common issues in generated vocabulary CSV.
 import argparse
 import csv
 import sys
-import codecs
 import re
 import json
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
+
+# Sentence checks: text in parentheses, and runs of latin letters left outside them
+_PARENS_CONTENT_RE = re.compile(r'\([^)]*\)')
+_LATIN_RUN_RE = re.compile(r'[a-zA-Z]{2,}')
+
+# Fields validate_row reads; the first seven are required
+_ROW_FIELDS = ("hanzi", "pinyin", "definition", "example_sentence",
+               "example_translation", "tips", "collocations", "frecuencia")
+REQUIRED_FIELDS = _ROW_FIELDS[:7]
 
 # Configure UTF-8 for Windows
-if sys.platform == "win32":
-    sys.stdout = codecs.getwriter("utf-8")(sys.stdout.detach())
+if sys.platform == "win32" and hasattr(sys.stdout, "reconfigure"):
+    sys.stdout.reconfigure(encoding="utf-8")
 
 
 class ValidationIssue:
     """Represents a validation issue found in a CSV row."""
+    # No per-instance __dict__: a large CSV can produce many issues
+    __slots__ = ("row_num", "hanzi", "field", "issue", "severity")
+    
     def __init__(self, row_num: int, hanzi: str, field: str, issue: str, severity: str = "warning"):
         self.row_num = row_num
         self.hanzi = hanzi
@@ -30,26 +41,33 @@ class ValidationIssue:
         return f"[{icon}] Row {self.row_num} ({self.hanzi}) - {self.field}: {self.issue}"
 
 
+def _split_nonempty(text: str, sep: str = "|") -> List[str]:
+    """Split on sep, keeping the non-empty items (stripped)."""
+    return [item for item in (part.strip() for part in text.split(sep)) if item]
+
+
 def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
     """Run all validations on a single row."""
     issues = []
-    hanzi = row.get("hanzi", "").strip()
+    # Every field is looked up and stripped once
+    values = [row.get(field, "").strip() for field in _ROW_FIELDS]
+    hanzi, pinyin, definition, sentences_cn, sentences_es, tips, collocations, frecuencia = values
     
     # Required fields
-    required = ["hanzi", "pinyin", "definition", "example_sentence", 
-                "example_translation", "tips", "collocations"]
-    for field in required:
-        if not row.get(field, "").strip():
+    for field, value in zip(REQUIRED_FIELDS, values):
+        if not value:
             issues.append(ValidationIssue(
                 row_num, hanzi or "???", field, 
                 "Campo requerido vacio", "error"
             ))
     
     # Sentence count
-    sentences_cn = row.get("example_sentence", "").strip()
-    sentences_es = row.get("example_translation", "").strip()
+    # Each "|"-separated field is split once and reused below
+    sentence_list = _split_nonempty(sentences_cn)
+    translation_list = _split_nonempty(sentences_es)
+    count_cn = len(sentence_list)
+    count_es = len(translation_list)
     if sentences_cn:
-        count_cn = len([s for s in sentences_cn.split("|") if s.strip()])
         if count_cn != 3:
             issues.append(ValidationIssue(
                 row_num, hanzi, "example_sentence",
@@ -57,7 +75,6 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
             ))
     
     if sentences_es:
-        count_es = len([s for s in sentences_es.split("|") if s.strip()])
         if count_es != 3:
             issues.append(ValidationIssue(
                 row_num, hanzi, "example_translation",
@@ -66,8 +83,6 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
     
     # Match CN and ES counts
     if sentences_cn and sentences_es:
-        count_cn = len([s for s in sentences_cn.split("|") if s.strip()])
-        count_es = len([s for s in sentences_es.split("|") if s.strip()])
         if count_cn != count_es:
             issues.append(ValidationIssue(
                 row_num, hanzi, "sentences",
@@ -75,9 +90,9 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
             ))
     
     # Collocation count
-    collocations = row.get("collocations", "").strip()
+    collocation_list = _split_nonempty(collocations)
     if collocations:
-        count = len([c for c in collocations.split("|") if c.strip()])
+        count = len(collocation_list)
         if count < 3 or count > 5:
             issues.append(ValidationIssue(
                 row_num, hanzi, "collocations",
@@ -86,16 +101,14 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
     
     # Hanzi in sentences
     if hanzi and sentences_cn:
-        sentences = [s.strip() for s in sentences_cn.split("|") if s.strip()]
-        missing = sum(1 for s in sentences if hanzi not in s.split("(")[0])
-        if missing == len(sentences):
+        # Only the part before any "(" counts (parentheses hold pinyin)
+        if not any(hanzi in s.partition("(")[0] for s in sentence_list):
             issues.append(ValidationIssue(
                 row_num, hanzi, "example_sentence",
                 f"'{hanzi}' no aparece en ninguna oracion", "error"
             ))
     
     # Definition length
-    definition = row.get("definition", "").strip()
     if definition:
         if len(definition) < 20:
             issues.append(ValidationIssue(
@@ -109,7 +122,6 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
             ))
     
     # Pinyin format
-    pinyin = row.get("pinyin", "").strip()
     if pinyin:
         if pinyin.isupper():
             issues.append(ValidationIssue(
@@ -123,7 +135,6 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
             ))
     
     # Tags
-    frecuencia = row.get("frecuencia", "").strip()
     if frecuencia:
         if "hsk:" not in frecuencia:
             issues.append(ValidationIssue(
@@ -138,13 +149,13 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
     
     # Pinyin cleanup coverage
     if sentences_cn:
-        for i, sentence in enumerate([s.strip() for s in sentences_cn.split("|") if s.strip()], 1):
+        for i, sentence in enumerate(sentence_list, 1):
             # Check for pinyin NOT in parentheses (won't be cleaned)
             # Look for pinyin-like patterns outside parentheses
-            # Remove content in parentheses first
-            without_parens = re.sub(r'\([^)]*\)', '', sentence)
+            # Remove content in parentheses first (if there are any)
+            without_parens = _PARENS_CONTENT_RE.sub('', sentence) if '(' in sentence else sentence
             # Check if there are still latin letters (potential uncleaned pinyin)
-            if re.search(r'[a-zA-Z]{2,}', without_parens):
+            if _LATIN_RUN_RE.search(without_parens):
                 issues.append(ValidationIssue(
                     row_num, hanzi, f"example_sentence[{i}]",
                     "Posible pinyin fuera de parentesis (no sera limpiado)", "warning"
@@ -159,7 +170,7 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
     
     # Check collocations format
     if collocations:
-        for i, colloc in enumerate([c.strip() for c in collocations.split("|") if c.strip()], 1):
+        for i, colloc in enumerate(collocation_list, 1):
             # Collocations should have format: "汉字 (traduccion)" or "汉字 (pinyin) - traduccion"
             if '(' not in colloc:
                 issues.append(ValidationIssue(
@@ -170,32 +181,43 @@ def validate_row(row: Dict[str, str], row_num: int) -> List[ValidationIssue]:
     return issues
 
 
+def iter_row_issues(csv_path: str) -> Iterator[Tuple[int, List[ValidationIssue]]]:
+    """Validate a CSV file lazily, yielding (row_num, issues) for each row."""
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row_num, row in enumerate(reader, start=2):
+            yield row_num, validate_row(row, row_num)
+
+
 def validate_csv(csv_path: str) -> Tuple[List[ValidationIssue], int]:
     """Validate entire CSV file."""
     issues = []
     total_rows = 0
-    
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row_num, row in enumerate(reader, start=2):
-            total_rows += 1
-            issues.extend(validate_row(row, row_num))
+    for _, row_issues in iter_row_issues(csv_path):
+        total_rows += 1
+        issues.extend(row_issues)
     
     return issues, total_rows
 
 
 def export_clean_csv(csv_path: str, problematic_rows: set, output_path: str):
     """Export CSV without problematic rows."""
-    with open(csv_path, 'r', encoding='utf-8') as f_in:
-        reader = csv.DictReader(f_in)
-        fieldnames = reader.fieldnames
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f_in:
+        # Rows are copied as plain lists (no dict per row)
+        reader = csv.reader(f_in)
+        fieldnames = next(reader, None) or []
+        n_fields = len(fieldnames)
         
         with open(output_path, 'w', encoding='utf-8', newline='') as f_out:
-            writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-            writer.writeheader()
+            writer = csv.writer(f_out)
+            writer.writerow(fieldnames)
             
-            for row_num, row in enumerate(reader, start=2):
+            # Blank lines are skipped and short rows padded, as DictReader/DictWriter
+            # do, so row numbers match validate_csv
+            for row_num, row in enumerate((r for r in reader if r), start=2):
                 if row_num not in problematic_rows:
+                    if len(row) < n_fields:
+                        row.extend([''] * (n_fields - len(row)))
                     writer.writerow(row)
     
     clean_count = sum(1 for _ in open(csv_path, encoding='utf-8')) - 1 - len(problematic_rows)
@@ -222,46 +244,56 @@ def main():
     print(f"Validating CSV: {args.csv_file}")
     print()
     
-    issues, total_rows = validate_csv(args.csv_file)
+    # Issues are printed as rows are validated and only tallied here,
+    # so the summary comes after them
+    total_rows = 0
+    error_count = 0
+    warning_count = 0
+    issue_count = 0
+    error_rows = set()
+    warning_rows = set()
     
-    if args.errors_only:
-        issues = [i for i in issues if i.severity == "error"]
+    for row_num, row_issues in iter_row_issues(args.csv_file):
+        total_rows += 1
+        for issue in row_issues:
+            if issue.severity == "error":
+                error_count += 1
+                error_rows.add(row_num)
+            elif args.errors_only:
+                continue
+            elif issue.severity == "warning":
+                warning_count += 1
+                warning_rows.add(row_num)
+            
+            if issue_count == 0:
+                print("ISSUES FOUND:")
+                print("-" * 80)
+            issue_count += 1
+            print(f"  {issue}")
     
-    errors = [i for i in issues if i.severity == "error"]
-    warnings = [i for i in issues if i.severity == "warning"]
+    if issue_count == 0:
+        print("✅ OK: No issues found!")
     
+    print()
     print("=" * 80)
     print("VALIDATION RESULTS")
     print("=" * 80)
     print(f"Total rows:    {total_rows}")
-    print(f"Errors:        {len(errors)}")
-    print(f"Warnings:      {len(warnings)}")
-    print(f"Total issues:  {len(issues)}")
+    print(f"Errors:        {error_count}")
+    print(f"Warnings:      {warning_count}")
+    print(f"Total issues:  {issue_count}")
     print("=" * 80)
     
-    if issues:
-        print()
-        print("ISSUES FOUND:")
-        print("-" * 80)
-        for issue in issues:
-            print(f"  {issue}")
-    else:
-        print()
-        print("✅ OK: No issues found!")
-    
     # Export clean CSV if requested
     if args.export_clean:
         # Determine which rows to consider problematic based on severity
-        problematic_rows = set()
-        
         if args.remove_severity == "errors":
             # Only remove rows with errors
-            problematic_rows = {issue.row_num for issue in errors}
+            problematic_rows = error_rows
             print(f"\nℹ️  Removing rows with ERRORS only ({len(problematic_rows)} rows)")
         else:  # "all"
             # Remove rows with errors OR warnings
-            all_issues = errors + warnings
-            problematic_rows = {issue.row_num for issue in all_issues}
+            problematic_rows = error_rows | warning_rows
             print(f"\nℹ️  Removing rows with ERRORS and WARNINGS ({len(problematic_rows)} rows)")
         
         export_clean_csv(args.csv_file, problematic_rows, args.export_clean)
@@ -0,0 +1,95 @@
+"""Regression check for csv_to_anki.find_failing_note."""
+
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import csv_to_anki  # noqa: E402
+
+
+class FakeAnki:
+    """Minimal AnkiConnect: addNote / addNotes / multi with duplicate checks."""
+
+    def __init__(self, bad_hanzi):
+        self.bad_hanzi = bad_hanzi
+        self.added = set()
+
+    def add_note(self, note):
+        hanzi = note["fields"]["Hanzi"]
+        if hanzi == self.bad_hanzi:
+            raise Exception(f"bad note {hanzi}")
+        if hanzi in self.added:
+            raise Exception("cannot create note because it is a duplicate")
+        self.added.add(hanzi)
+        return len(self.added)
+
+    def add_notes(self, notes):
+        # Like AnkiConnect: valid notes are added, then the errors are raised together
+        results, errors = [], []
+        for note in notes:
+            try:
+                results.append(self.add_note(note))
+            except Exception as e:
+                results.append(None)
+                errors.append(str(e))
+        if errors:
+            raise Exception(str(errors))
+        return results
+
+    def post(self, action, **params):
+        if action == "addNotes":
+            try:
+                return self.add_notes(params["notes"])
+            except Exception as e:
+                # anki.api.post returns instead of raising on duplicate errors
+                if "duplicate" in str(e).lower():
+                    return None
+                raise RuntimeError(f"AnkiConnect error in addNotes: {e}")
+        if action == "multi":
+            responses = []
+            for sub in params["actions"]:
+                try:
+                    responses.append({"result": self.add_note(sub["params"]["note"]), "error": None})
+                except Exception as e:
+                    responses.append({"result": None, "error": str(e)})
+            return responses
+        raise ValueError(action)
+
+
+def make_note(hanzi):
+    return {"modelName": "M", "fields": {"Hanzi": hanzi}}
+
+
+class FindFailingNoteTest(unittest.TestCase):
+
+    def test_bad_note_among_duplicates(self):
+        batch = [make_note(str(i)) for i in range(12)]
+        anki = FakeAnki(bad_hanzi="7")
+        # The failed batch already added every valid note
+        with self.assertRaises(Exception):
+            anki.add_notes(batch)
+
+        with mock.patch.object(csv_to_anki, "post", anki.post):
+            bad_idx, duplicate_idxs, error = csv_to_anki.find_failing_note(batch)
+
+        self.assertEqual(bad_idx, 7)
+        self.assertIn("bad note 7", str(error))
+        self.assertEqual(duplicate_idxs, list(range(7)))
+
+    def test_only_duplicates(self):
+        batch = [make_note(str(i)) for i in range(5)]
+        anki = FakeAnki(bad_hanzi=None)
+        anki.add_notes(batch)
+
+        with mock.patch.object(csv_to_anki, "post", anki.post):
+            bad_idx, duplicate_idxs, error = csv_to_anki.find_failing_note(batch)
+
+        self.assertEqual((bad_idx, error), (-1, None))
+        self.assertEqual(duplicate_idxs, list(range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()